@@ -1,14 +1,41 @@
-from flask import Flask, render_template, request, jsonify
-import json
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 import os
+import logging
+import heapq
+from collections import defaultdict
+import threading
+import orjson
+import ormsgpack
+from cachetools import TTLCache
 from dotenv import load_dotenv
 import openai
-from llama_cpp import Llama
+from llama_cpp import Llama, GGML_TYPE_Q8_0, llama_supports_gpu_offload
 
 # Load environment variables
 load_dotenv()
 
+# Per-request diagnostics go through logging at DEBUG level, so they cost nothing
+# unless LOG_LEVEL=DEBUG; startup banners below stay as plain prints
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper(), format='%(message)s')
+log = logging.getLogger(__name__)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that serializes with orjson straight to bytes"""
+    sort_keys = False
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, default=self.default), mimetype=self.mimetype)
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # Configure OpenAI
 openai.api_key = os.getenv('OPENAI_API_KEY')
@@ -17,37 +44,144 @@ openai.api_key = os.getenv('OPENAI_API_KEY')
 LOCAL_MODEL_PATH = 'models/phi-2-2.7b.gguf'
 USE_LOCAL_MODEL = True
 
+# Offload every layer when llama.cpp was built with CUDA/Metal; N_GPU_LAYERS overrides
+N_GPU_LAYERS = int(os.getenv('N_GPU_LAYERS', -1 if llama_supports_gpu_offload() else 0))
+# Lock the weights in RAM only when there is room for them (LLM_MLOCK=1); off by default
+USE_MLOCK = os.getenv('LLM_MLOCK', '').lower() in ('1', 'true')
+
 print(f"🔍 Model configuration:")
 print(f"   LOCAL_MODEL_PATH: {LOCAL_MODEL_PATH}")
 print(f"   USE_LOCAL_MODEL: {USE_LOCAL_MODEL}")
+print(f"   N_GPU_LAYERS: {N_GPU_LAYERS}")
+print(f"   USE_MLOCK: {USE_MLOCK}")
 print(f"   File exists: {os.path.exists(LOCAL_MODEL_PATH)}")
 
-# Load dataset store
-def load_datasets():
-    """Load datasets from JSON file"""
-    try:
-        with open('data/datasets.json', 'r', encoding='utf-8') as f:
-            datasets = json.load(f)
-        print(f"📊 Loaded {len(datasets)} consolidated datasets")
-        return datasets
-    except FileNotFoundError:
+# Dataset store, parsed once and kept in memory until the file changes on disk.
+# A MessagePack copy (data/convert_datasets.py) loads faster and is preferred
+# unless datasets.json has been edited since it was written.
+DATASETS_PATH = 'data/datasets.json'
+DATASETS_MSGPACK_PATH = 'data/datasets.msgpack'
+_catalogue_lock = threading.Lock()
+
+# /search filter name -> position of the matching field in build_search_fields()
+FILTER_FIELDS = {'owner': 2, 'topic': 3, 'year': 4, 'data_type': 5}
+
+def get_catalogue():
+    """Return the cached dataset catalogue, reparsing only when datasets.json changes"""
+    global _catalogue
+    
+    path, mtime = find_datasets_file()
+    if path is None:
         print("❌ Error: datasets.json not found in data folder")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"❌ Error: Invalid JSON in datasets.json: {e}")
-        return []
+        return build_catalogue(None, [])
+    
+    if _catalogue['mtime'] == mtime:
+        return _catalogue
+    
+    with _catalogue_lock:
+        # Another thread may have reloaded while we waited for the lock
+        if _catalogue['mtime'] == mtime:
+            return _catalogue
+        try:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            datasets = ormsgpack.unpackb(raw) if path == DATASETS_MSGPACK_PATH else orjson.loads(raw)
+        except (orjson.JSONDecodeError, ormsgpack.MsgpackDecodeError) as e:
+            print(f"❌ Error: Invalid data in {path}: {e}")
+            return _catalogue
+        _catalogue = build_catalogue(mtime, datasets)
+        print(f"📊 Loaded {len(datasets)} consolidated datasets from {path}")
+        return _catalogue
+
+def find_datasets_file():
+    """Path and mtime of the dataset file to load, or (None, None) if there is none"""
+    candidates = []
+    for path in (DATASETS_MSGPACK_PATH, DATASETS_PATH):
+        try:
+            candidates.append((os.stat(path).st_mtime, path))
+        except FileNotFoundError:
+            pass
+    if not candidates:
+        return None, None
+    # Newest file wins; on a tie the MessagePack copy (listed first) is kept
+    mtime, path = max(candidates, key=lambda c: c[0])
+    return path, mtime
+
+def build_catalogue(mtime, datasets):
+    """Bundle datasets with the lookup structures derived from them"""
+    search_fields = [build_search_fields(d) for d in datasets]
+    return {
+        'mtime': mtime,
+        'datasets': datasets,
+        'search_fields': search_fields,
+        'by_id': {d['id']: d for d in datasets},
+        'prompt_lines': {d['id']: build_prompt_line(d) for d in datasets},
+        'filter_indexes': {
+            name: build_filter_index(search_fields, position)
+            for name, position in FILTER_FIELDS.items()
+        },
+    }
+
+def build_filter_index(search_fields, position):
+    """Map each distinct lowercased field value to the indices of datasets having it"""
+    index = defaultdict(set)
+    for i, fields in enumerate(search_fields):
+        index[fields[position]].add(i)
+    return {value: frozenset(ids) for value, ids in index.items()}
+
+def match_filter_index(index, value):
+    """Indices of datasets whose field contains value.
+    
+    Only the distinct field values are scanned, not every dataset.
+    """
+    matches = [ids for field_value, ids in index.items() if value in field_value]
+    return frozenset().union(*matches)
+
+def build_prompt_line(dataset):
+    """Short one-line description of a dataset for the chat system prompt"""
+    return f"{dataset['id']}: {dataset['title'][:60]} ({dataset['topic']}, {dataset['owner']})"
+
+def build_search_fields(dataset):
+    """Lowercased copies of the fields /search and chat scoring match against.
+    
+    Stored alongside (not inside) the dataset dicts so they never leak into responses.
+    Order: title, description, owner, topic, year, data_type
+    """
+    return (
+        dataset.get('title', '').lower(),
+        dataset.get('description', '').lower(),
+        dataset.get('owner', '').lower(),
+        dataset.get('topic', '').lower(),
+        str(dataset.get('year', '')).lower(),
+        str(dataset.get('data_type', '')).lower(),
+    )
+
+_catalogue = build_catalogue(None, [])
+
+def load_datasets():
+    """Load datasets from JSON file (cached in memory)"""
+    return get_catalogue()['datasets']
 
 # Global model instance for caching
 _local_model = None
+# Loading may happen on a request thread (see the bottom of this file), so only one loads it
+_local_model_lock = threading.Lock()
 
 # Initialize local model
 def get_local_model():
     """Initialize and return local LLM model (cached)"""
-    global _local_model
-    
     if _local_model is not None:
         return _local_model
-        
+    
+    with _local_model_lock:
+        if _local_model is not None:
+            return _local_model
+        return load_local_model()
+
+def load_local_model():
+    """Load the local model into _local_model; returns it, or None if unavailable"""
+    global _local_model
+    
     try:
         if USE_LOCAL_MODEL and os.path.exists(LOCAL_MODEL_PATH):
             print(f"🤖 Loading local model: {LOCAL_MODEL_PATH}")
@@ -56,10 +190,13 @@ def get_local_model():
                 model_path=LOCAL_MODEL_PATH,
                 n_ctx=2048,  # Increased context for longer prompts
                 n_threads=8,  # More threads for faster processing
-                n_gpu_layers=0,  # Set to higher number if you have GPU
-                n_batch=512,  # Larger batch size for speed
+                n_gpu_layers=N_GPU_LAYERS,
+                n_batch=1024 if N_GPU_LAYERS else 512,  # Wider prefill batches keep a GPU busy
                 use_mmap=True,  # Memory mapping for faster loading
-                use_mlock=False  # Don't lock memory for speed
+                use_mlock=USE_MLOCK,  # Keep weights resident (llama.cpp only warns if RLIMIT_MEMLOCK is too low)
+                type_k=GGML_TYPE_Q8_0,  # 8-bit KV cache: about half the memory of f16
+                type_v=GGML_TYPE_Q8_0,
+                flash_attn=True  # Required by llama.cpp for a quantized V cache
             )
             print(f"✅ Model loaded and cached successfully!")
             return _local_model
@@ -70,6 +207,35 @@ def get_local_model():
         print(f"❌ Error loading local model: {e}")
         return None
 
+# Endpoints whose responses only change when the dataset file does, so browsers
+# and CDNs can reuse them (ETag = dataset file mtime)
+CACHEABLE_ENDPOINTS = frozenset(['search', 'api_datasets'])
+CACHE_MAX_AGE = 60
+
+def datasets_etag():
+    """ETag for the current dataset version, or None if nothing is loaded"""
+    mtime = get_catalogue()['mtime']
+    return None if mtime is None else str(mtime)
+
+@app.before_request
+def answer_not_modified():
+    """Return 304 for a catalogue endpoint when the client already has this version"""
+    if request.endpoint in CACHEABLE_ENDPOINTS:
+        etag = datasets_etag()
+        if etag and request.if_none_match.contains(etag):
+            return app.response_class(status=304)
+
+@app.after_request
+def add_cache_headers(response):
+    """Add ETag and Cache-Control to catalogue endpoint responses"""
+    if request.endpoint in CACHEABLE_ENDPOINTS and response.status_code in (200, 304):
+        etag = datasets_etag()
+        if etag:
+            response.set_etag(etag)
+            response.cache_control.public = True
+            response.cache_control.max_age = CACHE_MAX_AGE
+    return response
+
 @app.route('/')
 def index():
     """Main page with search and dataset catalogue"""
@@ -88,30 +254,32 @@ def search():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 20, type=int)  # Show 20 datasets per page
     
-    print(f"🔍 Search request - Query: '{query}', Owner: '{owner_filter}', Topic: '{topic_filter}', Year: '{year_filter}', Data Type: '{data_type_filter}', Page: {page}, Per Page: {per_page}")
+    log.debug("🔍 Search request - Query: '%s', Owner: '%s', Topic: '%s', Year: '%s', Data Type: '%s', Page: %s, Per Page: %s",
+              query, owner_filter, topic_filter, year_filter, data_type_filter, page, per_page)
     
-    datasets = load_datasets()
-    filtered_datasets = []
+    catalogue = get_catalogue()
+    datasets = catalogue['datasets']
+    search_fields = catalogue['search_fields']
     
-    for dataset in datasets:
-        # Apply filters
-        if query and query not in dataset.get('title', '').lower() and query not in dataset.get('description', '').lower():
-            continue
-        if owner_filter and owner_filter not in dataset.get('owner', '').lower():
-            continue
-        if topic_filter and topic_filter not in dataset.get('topic', '').lower():
-            continue
-        if year_filter and year_filter not in str(dataset.get('year', '')).lower():
-            continue
-        if data_type_filter and data_type_filter not in str(dataset.get('data_type', '')).lower():
-            continue
-        
-        filtered_datasets.append(dataset)
+    # Narrow down candidates with the filter indexes, most selective filter first
+    filters = {'owner': owner_filter, 'topic': topic_filter, 'year': year_filter, 'data_type': data_type_filter}
+    filter_matches = sorted(
+        (match_filter_index(catalogue['filter_indexes'][name], value) for name, value in filters.items() if value),
+        key=len
+    )
+    candidates = None
+    for matches in filter_matches:
+        candidates = matches if candidates is None else candidates & matches
+        if not candidates:
+            break
+    candidate_ids = range(len(datasets)) if candidates is None else sorted(candidates)
     
-    # Apply description truncation
-    for dataset in filtered_datasets:
-        if 'description' in dataset:
-            dataset['description'] = truncate_description(dataset['description'], max_length=150)
+    # Keyword search only over the remaining candidates (title first, description only if the title misses)
+    filtered_datasets = []
+    for i in candidate_ids:
+        if query and query not in search_fields[i][0] and query not in search_fields[i][1]:
+            continue
+        filtered_datasets.append(datasets[i])
     
     # Calculate pagination
     total_datasets = len(filtered_datasets)
@@ -126,7 +294,9 @@ def search():
     # Get datasets for current page
     start_idx = (page - 1) * per_page
     end_idx = start_idx + per_page
-    page_datasets = filtered_datasets[start_idx:end_idx]
+    
+    # Truncate descriptions for this page only
+    page_datasets = [with_truncated_description(d) for d in filtered_datasets[start_idx:end_idx]]
     
     # Prepare pagination info
     pagination_info = {
@@ -148,8 +318,7 @@ def search():
 @app.route('/dataset/<int:dataset_id>')
 def dataset_detail(dataset_id):
     """Dataset detail page"""
-    datasets = load_datasets()
-    dataset = next((d for d in datasets if d['id'] == dataset_id), None)
+    dataset = get_catalogue()['by_id'].get(dataset_id)
     
     if not dataset:
         return "Dataset not found", 404
@@ -170,155 +339,186 @@ def truncate_description(description, max_length=150):
     else:
         return truncated + "..."
 
+def with_truncated_description(dataset, max_length=150):
+    """Copy of a dataset with its description truncated.
+    
+    Dataset dicts are shared by the in-memory cache, so they must never be modified in place.
+    """
+    if 'description' not in dataset:
+        return dataset
+    return {**dataset, 'description': truncate_description(dataset['description'], max_length=max_length)}
+
+
+# Enhanced keywords that might indicate specific topics
+TOPIC_KEYWORDS = {
+    # Weather and Climate (highest specificity)
+    'weather': ['Weather', 'Climate', 'Meteorology'],
+    'climate': ['Weather', 'Climate', 'Meteorology'],
+    'temperature': ['Weather', 'Climate', 'Meteorology'],
+    'rainfall': ['Weather', 'Climate', 'Meteorology'],
+    'precipitation': ['Weather', 'Climate', 'Meteorology'],
+    'humidity': ['Weather', 'Climate', 'Meteorology'],
+    'wind': ['Weather', 'Climate', 'Meteorology'],
+    'solar': ['Weather', 'Climate', 'Meteorology'],
+    'meteorology': ['Weather', 'Climate', 'Meteorology'],
+    'bom': ['Weather', 'Climate', 'Meteorology'],
+    'bureau of meteorology': ['Weather', 'Climate', 'Meteorology'],
+
+    # Environment (but more specific)
+    'environment': ['Environment', 'Weather'],
+    'environmental': ['Environment', 'Weather'],
+    'pollution': ['Environment', 'Weather'],
+    'air quality': ['Environment', 'Weather'],
+    'emissions': ['Environment', 'Weather'],
+
+    # Health and Medical
+    'health': ['Health', 'Medical'],
+    'medical': ['Health', 'Medical'],
+    'hospital': ['Health', 'Medical'],
+    'disease': ['Health', 'Medical'],
+    'mortality': ['Health', 'Medical'],
+
+    # Economy and Business
+    'economy': ['Economy', 'Business'],
+    'economic': ['Economy', 'Business'],
+    'financial': ['Economy', 'Business'],
+    'business': ['Economy', 'Business'],
+    'trade': ['Economy', 'Business'],
+    'gdp': ['Economy', 'Business'],
+
+    # Transport and Infrastructure
+    'transport': ['Transport', 'Infrastructure'],
+    'infrastructure': ['Transport', 'Infrastructure'],
+    'roads': ['Transport', 'Infrastructure'],
+    'railway': ['Transport', 'Infrastructure'],
+    'aviation': ['Transport', 'Infrastructure'],
+
+    # Demographics and Population
+    'population': ['Demographics', 'Population'],
+    'demographics': ['Demographics', 'Population'],
+    'census': ['Demographics', 'Population'],
+    'birth': ['Demographics', 'Population'],
+    'death': ['Demographics', 'Population'],
+    'migration': ['Demographics', 'Population'],
+
+    # Education
+    'education': ['Education', 'School'],
+    'school': ['Education', 'School'],
+    'university': ['Education', 'School'],
+    'student': ['Education', 'School'],
+
+    # Housing and Property
+    'housing': ['Housing', 'Property'],
+    'property': ['Housing', 'Property'],
+    'real estate': ['Housing', 'Property'],
+    'construction': ['Housing', 'Property'],
+
+    # Justice and Crime
+    'crime': ['Justice', 'Crime'],
+    'justice': ['Justice', 'Crime'],
+    'police': ['Justice', 'Crime'],
+    'court': ['Justice', 'Crime'],
+
+    # Agriculture and Farming
+    'agriculture': ['Agriculture', 'Farming'],
+    'farming': ['Agriculture', 'Farming'],
+    'crop': ['Agriculture', 'Farming'],
+    'livestock': ['Agriculture', 'Farming'],
+
+    # Tourism and Travel
+    'tourism': ['Tourism', 'Travel'],
+    'travel': ['Tourism', 'Travel'],
+    'hotel': ['Tourism', 'Travel'],
+
+    # Technology and Innovation
+    'technology': ['Technology', 'Innovation'],
+    'innovation': ['Technology', 'Innovation'],
+    'digital': ['Technology', 'Innovation'],
+
+    # Taxation and Finance
+    'tax': ['Economy', 'Taxation'],
+    'taxation': ['Economy', 'Taxation'],
+    'superannuation': ['Economy', 'Taxation'],
+    'ato': ['Economy', 'Taxation'],
+
+    # Employment and Labour
+    'employment': ['Employment', 'Labour'],
+    'labour': ['Employment', 'Labour'],
+    'unemployment': ['Employment', 'Labour'],
+    'job': ['Employment', 'Labour'],
+    'workforce': ['Employment', 'Labour']
+}
+TOPIC_KEYWORDS = {keyword: frozenset(topics) for keyword, topics in TOPIC_KEYWORDS.items()}
+
+# Topic keywords that get weather-specific scoring, and the topics they score highest on
+WEATHER_TOPIC_KEYWORDS = frozenset(['weather', 'climate', 'temperature', 'rainfall', 'precipitation', 'humidity', 'wind', 'solar', 'meteorology', 'bom'])
+WEATHER_TOPICS = frozenset(['Weather', 'Climate', 'Meteorology'])
+
+# Enhanced location keywords
+LOCATION_KEYWORDS = frozenset(['sydney', 'melbourne', 'brisbane', 'perth', 'adelaide', 'canberra', 'darwin', 'hobart', 'australia', 'national', 'state', 'victoria', 'nsw', 'queensland', 'wa', 'sa', 'tas', 'nt', 'act'])
+
+# Enhanced year keywords
+YEAR_KEYWORDS = frozenset(['2024', '2023', '2022', '2021', '2020', 'recent', 'latest', 'current', 'new', 'old', 'historical'])
+
+# Enhanced owner keywords
+OWNER_KEYWORDS = frozenset(['abs', 'bureau', 'statistics', 'ato', 'taxation', 'education', 'health', 'transport', 'environment', 'bom', 'meteorology'])
+
+# Terms that mark a dataset title as clearly weather-related
+WEATHER_INDICATORS = ('weather', 'climate', 'temperature', 'rainfall', 'precipitation', 'humidity', 'wind', 'solar', 'meteorology', 'bom', 'bureau of meteorology')
+
+# Query terms that make a question weather-specific
+WEATHER_QUERY_TERMS = ('weather', 'climate', 'temperature', 'rainfall')
 
-def find_relevant_datasets(query, datasets, top_n=15):
+# Query words too generic to score on
+STOP_WORDS = frozenset(['some', 'data', 'please', 'help', 'find', 'need', 'want'])
+
+def find_relevant_datasets(query, catalogue, top_n=15):
     """Find datasets relevant to the user's query with improved scoring"""
+    datasets = catalogue['datasets']
     query_lower = query.lower()
-    relevant = []
-    
-    # Enhanced keywords that might indicate specific topics
-    topic_keywords = {
-        # Weather and Climate (highest specificity)
-        'weather': ['Weather', 'Climate', 'Meteorology'],
-        'climate': ['Weather', 'Climate', 'Meteorology'],
-        'temperature': ['Weather', 'Climate', 'Meteorology'],
-        'rainfall': ['Weather', 'Climate', 'Meteorology'],
-        'precipitation': ['Weather', 'Climate', 'Meteorology'],
-        'humidity': ['Weather', 'Climate', 'Meteorology'],
-        'wind': ['Weather', 'Climate', 'Meteorology'],
-        'solar': ['Weather', 'Climate', 'Meteorology'],
-        'meteorology': ['Weather', 'Climate', 'Meteorology'],
-        'bom': ['Weather', 'Climate', 'Meteorology'],
-        'bureau of meteorology': ['Weather', 'Climate', 'Meteorology'],
-        
-        # Environment (but more specific)
-        'environment': ['Environment', 'Weather'],
-        'environmental': ['Environment', 'Weather'],
-        'pollution': ['Environment', 'Weather'],
-        'air quality': ['Environment', 'Weather'],
-        'emissions': ['Environment', 'Weather'],
-        
-        # Health and Medical
-        'health': ['Health', 'Medical'],
-        'medical': ['Health', 'Medical'],
-        'hospital': ['Health', 'Medical'],
-        'disease': ['Health', 'Medical'],
-        'mortality': ['Health', 'Medical'],
-        
-        # Economy and Business
-        'economy': ['Economy', 'Business'],
-        'economic': ['Economy', 'Business'],
-        'financial': ['Economy', 'Business'],
-        'business': ['Economy', 'Business'],
-        'trade': ['Economy', 'Business'],
-        'gdp': ['Economy', 'Business'],
-        
-        # Transport and Infrastructure
-        'transport': ['Transport', 'Infrastructure'],
-        'infrastructure': ['Transport', 'Infrastructure'],
-        'roads': ['Transport', 'Infrastructure'],
-        'railway': ['Transport', 'Infrastructure'],
-        'aviation': ['Transport', 'Infrastructure'],
-        
-        # Demographics and Population
-        'population': ['Demographics', 'Population'],
-        'demographics': ['Demographics', 'Population'],
-        'census': ['Demographics', 'Population'],
-        'birth': ['Demographics', 'Population'],
-        'death': ['Demographics', 'Population'],
-        'migration': ['Demographics', 'Population'],
-        
-        # Education
-        'education': ['Education', 'School'],
-        'school': ['Education', 'School'],
-        'university': ['Education', 'School'],
-        'student': ['Education', 'School'],
-        
-        # Housing and Property
-        'housing': ['Housing', 'Property'],
-        'property': ['Housing', 'Property'],
-        'real estate': ['Housing', 'Property'],
-        'construction': ['Housing', 'Property'],
-        
-        # Justice and Crime
-        'crime': ['Justice', 'Crime'],
-        'justice': ['Justice', 'Crime'],
-        'police': ['Justice', 'Crime'],
-        'court': ['Justice', 'Crime'],
-        
-        # Agriculture and Farming
-        'agriculture': ['Agriculture', 'Farming'],
-        'farming': ['Agriculture', 'Farming'],
-        'crop': ['Agriculture', 'Farming'],
-        'livestock': ['Agriculture', 'Farming'],
-        
-        # Tourism and Travel
-        'tourism': ['Tourism', 'Travel'],
-        'travel': ['Tourism', 'Travel'],
-        'hotel': ['Tourism', 'Travel'],
-        
-        # Technology and Innovation
-        'technology': ['Technology', 'Innovation'],
-        'innovation': ['Technology', 'Innovation'],
-        'digital': ['Technology', 'Innovation'],
-        
-        # Taxation and Finance
-        'tax': ['Economy', 'Taxation'],
-        'taxation': ['Economy', 'Taxation'],
-        'superannuation': ['Economy', 'Taxation'],
-        'ato': ['Economy', 'Taxation'],
-        
-        # Employment and Labour
-        'employment': ['Employment', 'Labour'],
-        'labour': ['Employment', 'Labour'],
-        'unemployment': ['Employment', 'Labour'],
-        'job': ['Employment', 'Labour'],
-        'workforce': ['Employment', 'Labour']
-    }
     
-    # Enhanced location keywords
-    location_keywords = ['sydney', 'melbourne', 'brisbane', 'perth', 'adelaide', 'canberra', 'darwin', 'hobart', 'australia', 'national', 'state', 'victoria', 'nsw', 'queensland', 'wa', 'sa', 'tas', 'nt', 'act']
-    
-    # Enhanced year keywords
-    year_keywords = ['2024', '2023', '2022', '2021', '2020', 'recent', 'latest', 'current', 'new', 'old', 'historical']
+    # Topic matching only depends on the query and the dataset's topic, so scan the
+    # keywords against the query once and total up the points each topic earns
+    topic_scores = defaultdict(int)
+    for keyword, topics in TOPIC_KEYWORDS.items():
+        if keyword not in query_lower:
+            continue
+        for topic in topics:
+            # Give higher score for weather/climate specific queries
+            if keyword in WEATHER_TOPIC_KEYWORDS:
+                if topic in WEATHER_TOPICS:
+                    topic_scores[topic] += 8  # Very high score for exact weather matches
+                else:
+                    topic_scores[topic] += 2  # Lower score for generic environmental matches
+            else:
+                topic_scores[topic] += 5  # Standard score for other topic matches
     
-    # Enhanced owner keywords
-    owner_keywords = ['abs', 'bureau', 'statistics', 'ato', 'taxation', 'education', 'health', 'transport', 'environment', 'bom', 'meteorology']
+    # Everything else that only depends on the query is also worked out once up front
+    important_words = [word for word in query_lower.split() if len(word) > 3 and word not in STOP_WORDS]
+    is_weather_query = any(term in query_lower for term in WEATHER_QUERY_TERMS)
+    has_owner_keyword = any(owner in query_lower for owner in OWNER_KEYWORDS)
+    has_year_keyword = any(year in query_lower for year in YEAR_KEYWORDS)
+    wants_recent = any(word in query_lower for word in ['recent', 'latest', 'current', 'new'])
     
     # Score each dataset based on relevance
     scored_datasets = []
-    for dataset in datasets:
-        score = 0
+    for dataset, fields in zip(datasets, catalogue['search_fields']):
+        title_lower, desc_lower, owner_lower, _, year_str, _ = fields
         
         # Topic matching (highest priority) - but more specific
-        for keyword, topics in topic_keywords.items():
-            if keyword in query_lower and dataset['topic'] in topics:
-                # Give higher score for weather/climate specific queries
-                if keyword in ['weather', 'climate', 'temperature', 'rainfall', 'precipitation', 'humidity', 'wind', 'solar', 'meteorology', 'bom']:
-                    if dataset['topic'] in ['Weather', 'Climate', 'Meteorology']:
-                        score += 8  # Very high score for exact weather matches
-                    else:
-                        score += 2  # Lower score for generic environmental matches
-                else:
-                    score += 5  # Standard score for other topic matches
+        score = topic_scores.get(dataset['topic'], 0)
         
         # Title matching (very high priority) - but smarter
-        title_lower = dataset['title'].lower()
-        query_words = query_lower.split()
-        
         # Check for exact phrase matches first
         if query_lower in title_lower:
             score += 10  # Very high score for exact phrase match
         
         # Check for important word matches
-        important_words = [word for word in query_words if len(word) > 3 and word not in ['some', 'data', 'please', 'help', 'find', 'need', 'want']]
         for word in important_words:
             if word in title_lower:
                 score += 3  # Good score for important word matches
         
         # Description matching (high priority) - but more selective
-        desc_lower = dataset['description'].lower()
-        
         # Check for exact phrase matches in description
         if query_lower in desc_lower:
             score += 8  # Very high score for exact phrase in description
@@ -329,11 +529,11 @@ def find_relevant_datasets(query, datasets, top_n=15):
                 score += 2  # Good score for important words in description
         
         # Owner matching - but more specific
-        if any(owner in query_lower for owner in owner_keywords):
-            if any(owner in dataset['owner'].lower() for owner in owner_keywords):
+        if has_owner_keyword:
+            if any(owner in owner_lower for owner in OWNER_KEYWORDS):
                 # Give bonus for weather-specific owners
-                if any(weather_term in query_lower for weather_term in ['weather', 'climate', 'temperature', 'rainfall']):
-                    if 'meteorology' in dataset['owner'].lower() or 'bom' in dataset['owner'].lower():
+                if is_weather_query:
+                    if 'meteorology' in owner_lower or 'bom' in owner_lower:
                         score += 5  # High bonus for weather data from BOM
                     else:
                         score += 2  # Standard bonus for other owners
@@ -341,111 +541,202 @@ def find_relevant_datasets(query, datasets, top_n=15):
                     score += 3  # Standard owner bonus
         
         # Year matching
-        if any(year in query_lower for year in year_keywords):
-            if str(dataset['year']) in query_lower:
+        if has_year_keyword:
+            if year_str in query_lower:
                 score += 2
-            elif any(year in query_lower for year in ['recent', 'latest', 'current', 'new']):
-                if dataset['year'] >= 2020:  # Consider recent years
+            elif wants_recent:
+                if year_str >= '2020':  # Consider recent years (years are four-digit strings)
                     score += 1
         
         # Location matching - skip for now since coverage field doesn't exist
-        # if any(loc in query_lower for loc in location_keywords):
-        #     if 'coverage' in dataset and any(loc in dataset['coverage'].lower() for loc in location_keywords):
+        # if any(loc in query_lower for loc in LOCATION_KEYWORDS):
+        #     if 'coverage' in dataset and any(loc in dataset['coverage'].lower() for loc in LOCATION_KEYWORDS):
         #         score += 2
         
         # Penalize generic environmental terms for weather queries
-        if any(weather_term in query_lower for weather_term in ['weather', 'climate', 'temperature', 'rainfall']):
-            if dataset['topic'] == 'Environment' and 'land' in title_lower.lower():
+        if is_weather_query:
+            if dataset['topic'] == 'Environment' and 'land' in title_lower:
                 score -= 2  # Penalize land cover/use datasets for weather queries
             if 'land cover' in title_lower or 'land use' in title_lower:
                 score -= 3  # Further penalize land datasets for weather queries
         
         # Bonus for datasets that are clearly weather-related
-        weather_indicators = ['weather', 'climate', 'temperature', 'rainfall', 'precipitation', 'humidity', 'wind', 'solar', 'meteorology', 'bom', 'bureau of meteorology']
-        if any(indicator in title_lower for indicator in weather_indicators):
-            if any(weather_term in query_lower for weather_term in ['weather', 'climate', 'temperature', 'rainfall']):
+        if any(indicator in title_lower for indicator in WEATHER_INDICATORS):
+            if is_weather_query:
                 score += 6  # High bonus for clearly weather-related datasets
         
         # Add to scored list if score > 0
         if score > 0:
             scored_datasets.append((dataset, score))
     
-    # Sort by score (highest first) and return top results
-    scored_datasets.sort(key=lambda x: x[1], reverse=True)
-    
-    # Return top relevant datasets with truncated descriptions
+    # Return top relevant datasets (highest score first) with truncated descriptions
     relevant_datasets = []
-    for dataset, score in sorted(scored_datasets, key=lambda x: x[1], reverse=True)[:top_n]:
-        # Create a copy of the dataset with truncated description
-        truncated_dataset = dataset.copy()
-        truncated_dataset['description'] = truncate_description(dataset['description'], max_length=150)
-        relevant_datasets.append(truncated_dataset)
+    for dataset, score in heapq.nlargest(top_n, scored_datasets, key=lambda x: x[1]):
+        relevant_datasets.append(with_truncated_description(dataset))
     
-    print(f"🔍 Query: '{query}' - Found {len(relevant_datasets)} relevant datasets out of {len(datasets)} total")
-    if relevant_datasets:
-        print(f"🔍 Top matches: {[f'{d['id']}:{d['title'][:30]}...' for d in relevant_datasets[:3]]}")
+    log.debug("🔍 Query: '%s' - Found %d relevant datasets out of %d total", query, len(relevant_datasets), len(datasets))
+    if relevant_datasets and log.isEnabledFor(logging.DEBUG):
+        log.debug("🔍 Top matches: %s", [f"{d['id']}:{d['title'][:30]}..." for d in relevant_datasets[:3]])
     
     return relevant_datasets
 
+# Recent AI answers keyed by (datasets version, normalized message), so repeated
+# questions skip scoring and inference entirely
+CHAT_CACHE = TTLCache(maxsize=1024, ttl=3600)
+_chat_cache_lock = threading.Lock()
+
+# Fixed part of the chat system prompt. It comes first and the per-query dataset list
+# is appended after it, so llama-cpp's cached-prefix reuse skips it on every request.
+SYSTEM_PROMPT_PREAMBLE = """You are an AI assistant for Australian open datasets.
+
+Help users find relevant data and cite dataset IDs. Be specific about which datasets match their needs.
+
+Rules:
+- Only recommend datasets that are actually available in the list below
+- Cite dataset IDs when making recommendations
+- If no exact match, suggest the closest alternatives
+- Be concise and helpful"""
+
+def chat_cache_key(catalogue, user_message):
+    """Response cache key for a chat message"""
+    return (catalogue['mtime'], ' '.join(user_message.lower().split()))
+
+def get_cached_chat(catalogue, cache_key):
+    """Cached answer and its relevant datasets, or None"""
+    with _chat_cache_lock:
+        cached = CHAT_CACHE.get(cache_key)
+    if not cached:
+        return None
+    log.debug("⚡ Chat cache hit")
+    return {
+        'response': cached['response'],
+        'relevant_datasets': [with_truncated_description(catalogue['by_id'][i]) for i in cached['dataset_ids']]
+    }
+
+def cache_chat(cache_key, ai_response, relevant_datasets):
+    """Remember an AI answer for repeats of the same question"""
+    with _chat_cache_lock:
+        CHAT_CACHE[cache_key] = {
+            'response': ai_response,
+            'dataset_ids': [d['id'] for d in relevant_datasets]
+        }
+
+def build_system_prompt(scored_datasets, catalogue):
+    """System prompt listing the datasets most relevant to this query"""
+    datasets = catalogue['datasets']
+    
+    # Limit context to top 15 most relevant datasets to stay within token limits
+    context_datasets = scored_datasets[:15]
+    
+    # If no relevant datasets found, include a few general ones
+    if not context_datasets:
+        context_datasets = datasets[:5]
+    
+    # List the datasets in id order so similar queries share as much of the prompt
+    # prefix as possible, then give the relevance ranking as a short hint at the end
+    context_ids = [d['id'] for d in context_datasets]
+    dataset_summary = [catalogue['prompt_lines'][i] for i in sorted(context_ids)]
+    ranking = ', '.join(str(i) for i in context_ids)
+    
+    # Create system prompt (much shorter and focused)
+    system_prompt = (
+        f"{SYSTEM_PROMPT_PREAMBLE}\n\n"
+        f"Available datasets for this query: {', '.join(dataset_summary)}\n\n"
+        f"Most relevant first: {ranking}"
+    )
+    
+    log.debug("🔍 Context datasets: %d (out of %d total)", len(context_datasets), len(datasets))
+    log.debug("🔍 System prompt length: %d characters", len(system_prompt))
+    return system_prompt
+
+def ask_openai(system_prompt, user_message):
+    """Answer with OpenAI, trying cheaper models first; None if unavailable"""
+    if not openai.api_key:
+        return None
+    
+    try:
+        log.debug("🔄 Trying OpenAI as fallback...")
+        client = openai.OpenAI(api_key=openai.api_key)
+        
+        # Try different models in order of preference
+        models_to_try = ["gpt-3.5-turbo", "gpt-4o-mini", "gpt-4o"]
+        
+        for model in models_to_try:
+            try:
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_message}
+                    ],
+                    max_tokens=500,
+                    temperature=0.7
+                )
+                log.debug("✅ OpenAI model %s successful", model)
+                return response.choices[0].message.content
+            except Exception as e:
+                log.warning("❌ OpenAI model %s failed: %.100s...", model, e)
+                if "insufficient_quota" in str(e) or "quota" in str(e):
+                    continue
+                else:
+                    raise e
+                    
+    except Exception as e:
+        log.warning("❌ OpenAI fallback failed: %s", e)
+    return None
+
+def fallback_response(datasets):
+    """Canned answer for when neither the local model nor OpenAI responded"""
+    return f"""I'm currently experiencing technical difficulties with my AI service. 
+
+However, I can still help you explore the {len(datasets)} available datasets! Here are some suggestions:
+
+• **Search by topic**: Try filtering by topics like 'Health', 'Environment', 'Economy', or 'Transport'
+• **Browse by owner**: Look for datasets from specific sources like 'Australian Bureau of Statistics' or 'Bureau of Meteorology'
+• **Use the search bar**: Type keywords related to your research needs
+
+For example, if you're looking for climate data, try filtering by topic 'Environment' and owner 'Bureau of Meteorology'.
+
+Please check back later for AI assistance, or contact support if you need immediate help."""
+
 @app.route('/chat', methods=['POST'])
 def chat():
     """AI chat endpoint"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         user_message = data.get('message', '').strip()
         
         if not user_message:
             return jsonify({'error': 'No message provided'}), 400
         
-        print(f"🔍 Chat request: {user_message}")
-        
-        datasets = load_datasets()
-        
-        # SMART DATASET SELECTION: Only include most relevant datasets to avoid context overflow
-        relevant_datasets_for_context = find_relevant_datasets(user_message, datasets)
+        log.debug("🔍 Chat request: %s", user_message)
         
-        # Limit context to top 15 most relevant datasets to stay within token limits
-        context_datasets = relevant_datasets_for_context[:15]
+        catalogue = get_catalogue()
+        datasets = catalogue['datasets']
         
-        # If no relevant datasets found, include a few general ones
-        if not context_datasets:
-            context_datasets = datasets[:5]
+        # Serve repeated questions from the response cache (?cache_bust=1 skips it)
+        cache_key = chat_cache_key(catalogue, user_message)
+        if not request.args.get('cache_bust'):
+            cached = get_cached_chat(catalogue, cache_key)
+            if cached:
+                return jsonify(cached)
         
-        # Create focused dataset context (much shorter)
-        dataset_summary = []
-        for d in context_datasets:
-            dataset_summary.append(f"{d['id']}: {d['title']} ({d['topic']}, {d['owner']})")
-        
-        # Create system prompt (much shorter and focused)
-        system_prompt = f"""You are an AI assistant for Australian open datasets. 
-
-Available datasets for this query: {', '.join(dataset_summary)}
-
-Help users find relevant data and cite dataset IDs. Be specific about which datasets match their needs.
-
-Rules:
-- Only recommend datasets that are actually available in the list above
-- Cite dataset IDs when making recommendations
-- If no exact match, suggest the closest alternatives
-- Be concise and helpful"""
-        
-        print(f"🔍 Context datasets: {len(context_datasets)} (out of {len(datasets)} total)")
-        print(f"🔍 System prompt length: {len(system_prompt)} characters")
+        # SMART DATASET SELECTION: Only include most relevant datasets to avoid context overflow
+        # (scored once - the same ranking feeds both the prompt and the displayed results)
+        scored_datasets = find_relevant_datasets(user_message, catalogue, top_n=15)
+        system_prompt = build_system_prompt(scored_datasets, catalogue)
         
         # Try local model first, then OpenAI as fallback
         ai_response = None
         
         # Try local model - using the exact working code from our test
         if USE_LOCAL_MODEL:
-            print(f"🔍 USE_LOCAL_MODEL: {USE_LOCAL_MODEL}")
             local_model = get_local_model()
-            print(f"🔍 Local model object: {local_model}")
             
             if local_model:
                 try:
-                    print("🤖 Using local model for response...")
                     prompt = f"{system_prompt}\n\nUser: {user_message}\n\nAssistant:"
-                    print(f"🔍 Prompt length: {len(prompt)} characters")
+                    log.debug("🤖 Using local model for response (prompt length: %d characters)", len(prompt))
                     
                     # Use the exact working parameters from our test
                     response = local_model(
@@ -454,93 +745,124 @@ Rules:
                         temperature=0.3   # Lower temperature for more focused responses
                     )
                     
-                    print(f"🔍 Raw response: {response}")
-                    
                     if response and 'choices' in response and len(response['choices']) > 0:
                         ai_response = response['choices'][0]['text'].strip()
-                        print(f"✅ Local model response successful: {ai_response[:100]}...")
+                        log.debug("✅ Local model response successful: %.100s...", ai_response)
                     else:
-                        print("⚠️ Local model returned empty response")
+                        log.warning("⚠️ Local model returned empty response")
                         ai_response = None
                         
                 except Exception as e:
-                    print(f"❌ Local model error: {e}")
-                    print(f"�� Error type: {type(e).__name__}")
-                    import traceback
-                    traceback.print_exc()
+                    log.exception("❌ Local model error: %s", e)
                     ai_response = None
             else:
-                print("⚠️ Local model is None")
+                log.warning("⚠️ Local model is None")
         
         # Fallback to OpenAI if local model failed or not available
-        if not ai_response and openai.api_key:
-            try:
-                print("🔄 Trying OpenAI as fallback...")
-                client = openai.OpenAI(api_key=openai.api_key)
-                
-                # Try different models in order of preference
-                models_to_try = ["gpt-3.5-turbo", "gpt-4o-mini", "gpt-4o"]
-                
-                for model in models_to_try:
-                    try:
-                        response = client.chat.completions.create(
-                            model=model,
-                            messages=[
-                                {"role": "system", "content": system_prompt},
-                                {"role": "user", "content": user_message}
-                            ],
-                            max_tokens=500,
-                            temperature=0.7
-                        )
-                        ai_response = response.choices[0].message.content
-                        print(f"✅ OpenAI model {model} successful")
-                        break
-                    except Exception as e:
-                        print(f"❌ OpenAI model {model} failed: {str(e)[:100]}...")
-                        if "insufficient_quota" in str(e) or "quota" in str(e):
-                            continue
-                        else:
-                            raise e
-                            
-            except Exception as e:
-                print(f"❌ OpenAI fallback failed: {e}")
-        
-        # Final fallback if both local and OpenAI failed
         if not ai_response:
-            ai_response = f"""I'm currently experiencing technical difficulties with my AI service. 
-
-However, I can still help you explore the {len(datasets)} available datasets! Here are some suggestions:
-
-• **Search by topic**: Try filtering by topics like 'Health', 'Environment', 'Economy', or 'Transport'
-• **Browse by owner**: Look for datasets from specific sources like 'Australian Bureau of Statistics' or 'Bureau of Meteorology'
-• **Use the search bar**: Type keywords related to your research needs
-
-For example, if you're looking for climate data, try filtering by topic 'Environment' and owner 'Bureau of Meteorology'.
-
-Please check back later for AI assistance, or contact support if you need immediate help."""
+            ai_response = ask_openai(system_prompt, user_message)
         
-        # Find relevant datasets based on the query (for display)
-        relevant_datasets = find_relevant_datasets(user_message, datasets)
+        # Only cache real AI answers - the fallback below should go away once the AI is back
+        if ai_response:
+            cache_chat(cache_key, ai_response, scored_datasets[:10])
         
-        # Limit displayed results to top 10 most relevant
-        relevant_datasets = relevant_datasets[:10]
+        # Final fallback if both local and OpenAI failed
+        if not ai_response:
+            ai_response = fallback_response(datasets)
         
         return jsonify({
             'response': ai_response,
-            'relevant_datasets': relevant_datasets
+            'relevant_datasets': scored_datasets[:10]  # Top 10 most relevant for display
         })
         
     except Exception as e:
-        print(f"❌ Chat error: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception("❌ Chat error: %s", e)
         return jsonify({'error': 'Internal server error'}), 500
 
+def sse_event(payload):
+    """Format a payload as one server-sent event"""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming AI chat endpoint (server-sent events).
+    
+    Emits {"delta": text} events as the local model generates, then a final
+    {"done": true, "response": ..., "relevant_datasets": [...]} event.
+    """
+    data = request.get_json(silent=True) or {}
+    user_message = data.get('message', '').strip()
+    
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    log.debug("🔍 Streaming chat request: %s", user_message)
+    
+    catalogue = get_catalogue()
+    datasets = catalogue['datasets']
+    cache_key = chat_cache_key(catalogue, user_message)
+    cached = None if request.args.get('cache_bust') else get_cached_chat(catalogue, cache_key)
+    
+    def generate():
+        if cached:
+            yield sse_event({'delta': cached['response']})
+            yield sse_event({'done': True, **cached})
+            return
+        
+        scored_datasets = find_relevant_datasets(user_message, catalogue, top_n=15)
+        system_prompt = build_system_prompt(scored_datasets, catalogue)
+        
+        # Stream tokens from the local model as they are generated
+        chunks = []
+        local_model = get_local_model() if USE_LOCAL_MODEL else None
+        if local_model:
+            try:
+                prompt = f"{system_prompt}\n\nUser: {user_message}\n\nAssistant:"
+                for chunk in local_model(prompt, max_tokens=150, temperature=0.3, stream=True):
+                    text = chunk['choices'][0]['text']
+                    if text:
+                        chunks.append(text)
+                        yield sse_event({'delta': text})
+            except Exception as e:
+                log.exception("❌ Local model streaming error: %s", e)
+        ai_response = ''.join(chunks).strip()
+        
+        # OpenAI / canned fallbacks arrive as a single delta
+        if not ai_response:
+            ai_response = ask_openai(system_prompt, user_message)
+            if ai_response:
+                yield sse_event({'delta': ai_response})
+        
+        if ai_response:
+            cache_chat(cache_key, ai_response, scored_datasets[:10])
+        else:
+            ai_response = fallback_response(datasets)
+            yield sse_event({'delta': ai_response})
+        
+        yield sse_event({
+            'done': True,
+            'response': ai_response,
+            'relevant_datasets': scored_datasets[:10]
+        })
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
 @app.route('/api/datasets')
 def api_datasets():
     """API endpoint to get all datasets"""
     datasets = load_datasets()
     return jsonify(datasets)
 
+# Load the catalogue and model at import time rather than on the first request.
+# Under `gunicorn --preload` this happens once in the master, and the forked
+# workers share the mmap'd model weights copy-on-write. A CUDA/Metal context
+# can't be used across fork, so with GPU offload each worker loads the model
+# itself on its first chat request instead.
+get_catalogue()
+if USE_LOCAL_MODEL and N_GPU_LAYERS == 0:
+    get_local_model()
+
 if __name__ == '__main__':
-    app.run(debug=True)
+    # No reloader: it would import this module, and load the model, a second time
+    app.run(debug=os.getenv('FLASK_DEBUG', '').lower() in ('1', 'true'), use_reloader=False)
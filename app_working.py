@@ -1,69 +1,331 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context
+from flask_compress import Compress
 import json
+import orjson
+import hashlib
 import os
+import re
+import math
+import heapq
+import threading
+import time
+import queue
+from contextlib import contextmanager
+from collections import defaultdict, Counter, deque
 from dotenv import load_dotenv
 import openai
-from llama_cpp import Llama
+from llama_cpp import Llama, llama_supports_gpu_offload
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+app.json.compact = True  # No pretty-printing in jsonify responses, even in debug mode
+app.config['COMPRESS_MIMETYPES'] = ['application/json', 'text/html', 'text/javascript']
+app.config['COMPRESS_LEVEL'] = 6
+Compress(app)  # gzip /api/datasets and /search; text/event-stream is left alone
+
+JSON_MAX_AGE = 60
 
 # Configure OpenAI
 openai.api_key = os.getenv('OPENAI_API_KEY')
 
-# Configure Local Model (hardcoded for now to ensure it works)
-LOCAL_MODEL_PATH = 'models/phi-2-2.7b.gguf'
+# One client for the process, so its connection pool is reused between requests
+_OAI_CLIENT = openai.OpenAI(api_key=openai.api_key) if openai.api_key else None
+
+# Models that have reported an exhausted quota are not tried again
+_QUOTA_BANNED = set()
+
+# Circuit breaker: after OPENAI_BREAKER_FAILURES failed fallbacks within
+# OPENAI_BREAKER_WINDOW seconds, go straight to the canned answer
+OPENAI_BREAKER_FAILURES = 3
+OPENAI_BREAKER_WINDOW = 60
+_openai_failures = deque(maxlen=OPENAI_BREAKER_FAILURES)
+
+# Configure Local Model: PHI2_QUANT picks the quantization of the Phi-2 GGUF file
+# (4-bit Q4_K_M by default; generation is memory-bound, so smaller weights are faster).
+# Falls back to the original unquantized file if that is all that has been downloaded.
+PHI2_QUANT = os.getenv('PHI2_QUANT', 'Q4_K_M')
+LOCAL_MODEL_PATH = f'models/phi-2.{PHI2_QUANT}.gguf'
+if not os.path.exists(LOCAL_MODEL_PATH) and os.path.exists('models/phi-2-2.7b.gguf'):
+    LOCAL_MODEL_PATH = 'models/phi-2-2.7b.gguf'
 USE_LOCAL_MODEL = True
 
+# Offload every layer when llama.cpp was built with CUDA/Metal; N_GPU_LAYERS overrides
+N_GPU_LAYERS = int(os.getenv('N_GPU_LAYERS', -1 if llama_supports_gpu_offload() else 0))
+# Lock the weights in RAM only when there is room for them (LLM_MLOCK=1); off by default
+USE_MLOCK = os.getenv('LLM_MLOCK', '').lower() in ('1', 'true')
+
+# CPUs this process may run on (respects taskset/container limits, unlike os.cpu_count)
+CPU_COUNT = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+
+# Number of model instances serving requests in parallel; the CPUs are split between them
+LLM_WORKERS = max(1, int(os.getenv('LLM_WORKERS', 1)))
+THREADS_PER_WORKER = max(1, CPU_COUNT // LLM_WORKERS)
+
 print(f"🔍 Model configuration:")
 print(f"   LOCAL_MODEL_PATH: {LOCAL_MODEL_PATH}")
 print(f"   USE_LOCAL_MODEL: {USE_LOCAL_MODEL}")
+print(f"   N_GPU_LAYERS: {N_GPU_LAYERS}")
+print(f"   USE_MLOCK: {USE_MLOCK}")
+print(f"   CPU_COUNT: {CPU_COUNT}")
+print(f"   LLM_WORKERS: {LLM_WORKERS}")
 print(f"   File exists: {os.path.exists(LOCAL_MODEL_PATH)}")
 
-# Global model instance for caching
-_local_model = None
+# Pool of idle Llama instances. A request takes the first free one and hands it
+# back when done, so each instance only ever serves one request at a time. Every
+# prompt starts with the same system prompt preamble, and llama-cpp reuses the
+# longest cached token prefix, so the preamble is only evaluated on first use.
+_model_pool = None
+_model_pool_lock = threading.Lock()
+
+# Dataset catalogue, parsed once and kept in memory until the file changes on disk.
+# A reload builds a whole new catalogue and publishes it with one assignment; each
+# request takes it once, so it never mixes datasets and indexes from different loads.
+DATASETS_PATH = 'data/datasets.json'
+_datasets_lock = threading.Lock()
+_catalogue = None
+
+# Only this many retrieved datasets go into the chat prompt
+RAG_TOP_K = 5
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+SYSTEM_PROMPT_PREAMBLE = """You are an AI assistant helping users discover Australian open datasets.
+
+Your role is to:
+1. Help users understand what data they need
+2. Recommend relevant datasets from the available inventory
+3. Explain dataset metadata in simple terms
+4. Always cite specific dataset IDs when making recommendations
+
+Keep responses helpful, accurate, and focused on the available datasets. Respond in under 80 words."""
+
+# Messages answered straight from the catalogue without the model: greetings/help,
+# "list datasets", "dataset 42" lookups, and bare owner/topic/year filters ("ABS 2021 datasets").
+# Each pattern has to match the whole message, so longer questions still reach the model.
+GREETING_RE = re.compile(
+    r"^\s*(hi|hello|hey|g'?day|good (morning|afternoon|evening)|help|thanks|thank you"
+    r"|what can you do)\W*$"
+)
+LIST_ALL_RE = re.compile(r"^\s*(list|show)( me)? (all )?(the )?datasets\W*$")
+DATASET_ID_RE = re.compile(r"^\s*((show|get|find|open)( me)? )?(the )?dataset\s+#?(\d+)\W*$")
+FILTER_FILLER_WORDS = frozenset([
+    'show', 'list', 'find', 'get', 'me', 'all', 'the', 'any', 'some', 'dataset', 'datasets',
+    'data', 'from', 'by', 'in', 'on', 'for', 'about', 'of', 'and', 'published', 'year', 'please'
+])
+INTENT_LIST_LIMIT = 10
+
+# Generation limits: short answers, cut off before the model writes the next turn itself
+LOCAL_MAX_TOKENS = 150
+OPENAI_MAX_TOKENS = 200
+CHAT_STOP = ["\nUser:", "</s>"]
 
 # Load dataset store
-def load_datasets():
-    with open('data/datasets.json', 'r', encoding='utf-8') as f:
-        return json.load(f)
+def get_catalogue():
+    """Return the cached dataset catalogue, re-reading the file only after it changes"""
+    global _catalogue
+    
+    mtime = os.stat(DATASETS_PATH).st_mtime
+    catalogue = _catalogue
+    if catalogue is not None and catalogue['mtime'] == mtime:
+        return catalogue
+    
+    with _datasets_lock:
+        # Another thread may have reloaded while we waited for the lock
+        if _catalogue is None or _catalogue['mtime'] != mtime:
+            with open(DATASETS_PATH, 'r', encoding='utf-8') as f:
+                datasets = json.load(f)
+            _catalogue = build_catalogue(mtime, datasets)
+        return _catalogue
+
+def build_catalogue(mtime, datasets):
+    """Bundle datasets with the lookup structures derived from them"""
+    by_owner = build_index(datasets, lambda d: d['owner'])
+    by_topic = build_index(datasets, lambda d: d['topic'])
+    by_year = build_index(datasets, lambda d: str(d['year']))
+    filter_values, filter_value_re = build_filter_matcher({'owner': by_owner, 'topic': by_topic, 'year': by_year})
+    tfidf_postings, idf = build_tfidf_index(datasets)
+    datasets_json = orjson.dumps(datasets)
+    return {
+        'mtime': mtime,
+        'datasets': datasets,
+        'by_id': {d['id']: d for d in datasets},
+        'index_by_id': {d['id']: i for i, d in enumerate(datasets)},
+        # Search: lowercased (title, description) per dataset, and exact value ->
+        # dataset index sets for the owner/topic/year filters
+        'search_fields': [(d['title'].lower(), d['description'].lower()) for d in datasets],
+        'by_owner': by_owner,
+        'by_topic': by_topic,
+        'by_year': by_year,
+        # Chat intent check: lowercased filter value -> [(field, dataset index set)],
+        # and a regex finding any of them in a message
+        'filter_values': filter_values,
+        'filter_value_re': filter_value_re,
+        # Chat retrieval: TF-IDF inverted index (term -> [(dataset index, weight)]),
+        # the terms' IDF, and each dataset's prompt line
+        'tfidf_postings': tfidf_postings,
+        'idf': idf,
+        'context_lines': [build_context_line(d) for d in datasets],
+        # /api/datasets body serialized once, and its content hash used as the ETag
+        'json': datasets_json,
+        'etag': hashlib.blake2b(datasets_json, digest_size=16).hexdigest(),
+    }
+
+def etag_matches(etag):
+    """True if the request's If-None-Match already names etag (flask-compress appends ':gzip' etc.)"""
+    return any(tag.partition(':')[0] == etag for tag in request.if_none_match)
+
+def cacheable(response, etag):
+    """Attach the ETag and a short public Cache-Control to a JSON response"""
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = JSON_MAX_AGE
+    return response
+
+def build_index(datasets, key):
+    """Map each value of key(dataset) to the set of dataset indexes having it"""
+    index = defaultdict(set)
+    for i, dataset in enumerate(datasets):
+        index[key(dataset)].add(i)
+    return dict(index)
+
+def build_filter_matcher(indexes):
+    """Lowercased filter value -> [(field, dataset indexes)], plus a regex matching any value (longest first)"""
+    values = defaultdict(list)
+    for field, index in indexes.items():
+        for value, dataset_indexes in index.items():
+            if value.strip():
+                values[value.lower()].append((field, dataset_indexes))
+    alternatives = '|'.join(re.escape(value) for value in sorted(values, key=len, reverse=True))
+    return dict(values), re.compile(rf'(?<!\w)(?:{alternatives})(?!\w)' if values else r'(?!)')
+
+def tokenize(text):
+    """Lowercase alphanumeric terms of text"""
+    return TOKEN_RE.findall(text.lower())
+
+def build_tfidf_index(datasets):
+    """TF-IDF inverted index over each dataset's title, description, topic and owner.
+    
+    Dataset vectors are L2-normalised, so summing query weight * posting weight
+    over the query's terms ranks datasets by cosine similarity.
+    """
+    term_counts = [Counter(tokenize(f"{d['title']} {d['description']} {d['topic']} {d['owner']}")) for d in datasets]
+    
+    document_frequency = Counter()
+    for counts in term_counts:
+        document_frequency.update(counts.keys())
+    n = len(datasets)
+    idf = {term: math.log((1 + n) / (1 + df)) + 1 for term, df in document_frequency.items()}
+    
+    postings = defaultdict(list)
+    for i, counts in enumerate(term_counts):
+        weights = {term: count * idf[term] for term, count in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        for term, weight in weights.items():
+            postings[term].append((i, weight / norm))
+    return dict(postings), idf
+
+def retrieve_datasets(query, catalogue, top_k=RAG_TOP_K):
+    """Indexes of the top_k datasets most similar to the query (best first)"""
+    idf = catalogue['idf']
+    postings = catalogue['tfidf_postings']
+    scores = defaultdict(float)
+    for term, count in Counter(tokenize(query)).items():
+        if term not in idf:
+            continue
+        query_weight = count * idf[term]
+        for i, weight in postings[term]:
+            scores[i] += query_weight * weight
+    return [i for i, _ in heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])]
+
+def build_context_line(d):
+    """One dataset's entry in the chat prompt (description shortened to fit n_ctx)"""
+    description = d['description'] if len(d['description']) <= 200 else d['description'][:200] + "..."
+    return (
+        f"Dataset {d['id']}: {d['title']} - {description} "
+        f"(Owner: {d['owner']}, Topic: {d['topic']}, Year: {d['year']}, "
+        f"License: {d['license']}, Coverage: {d.get('coverage', d.get('spatial_coverage', ''))})"
+    )
+
+def build_system_prompt(dataset_indexes, catalogue):
+    """Chat system prompt with only the retrieved datasets as context"""
+    context_lines = catalogue['context_lines']
+    dataset_context = "\n\n".join(context_lines[i] for i in dataset_indexes) or "(no matching datasets)"
+    return (
+        f"{SYSTEM_PROMPT_PREAMBLE}\n\n"
+        f"The {len(dataset_indexes)} datasets from the catalogue of {len(catalogue['datasets'])} most relevant to this question:\n\n"
+        f"{dataset_context}"
+    )
+
+def get_dataset(dataset_id):
+    """Look up a dataset by id, or None"""
+    return get_catalogue()['by_id'].get(dataset_id)
 
 # Initialize local model
-def get_local_model():
-    """Initialize and return local LLM model (cached)"""
-    global _local_model
+def load_local_model():
+    """Load one Llama instance"""
+    print(f"🤖 Loading local model: {LOCAL_MODEL_PATH}")
+    # Optimize for speed with Phi-2
+    model = Llama(
+        model_path=LOCAL_MODEL_PATH,
+        n_ctx=1024,  # Smaller context for speed
+        n_threads=min(THREADS_PER_WORKER, 8),  # Generation is memory-bound; more threads stop helping
+        n_threads_batch=THREADS_PER_WORKER,  # Prompt processing is compute-bound, so use every CPU
+        n_gpu_layers=N_GPU_LAYERS,
+        n_batch=1024,  # Evaluate the whole retrieved prompt in one batch
+        n_ubatch=512,
+        use_mmap=True,  # Memory mapping for faster loading (instances share the mapped weights)
+        use_mlock=USE_MLOCK  # Keep weights resident (llama.cpp only warns if RLIMIT_MEMLOCK is too low)
+    )
+    return model
+
+def get_model_pool():
+    """Initialize and return the pool of local model slots (cached), or None"""
+    global _model_pool
     
-    if _local_model is not None:
-        return _local_model
-        
-    try:
-        if USE_LOCAL_MODEL and os.path.exists(LOCAL_MODEL_PATH):
-            print(f"🤖 Loading local model: {LOCAL_MODEL_PATH}")
-            # Optimize for speed with Phi-2
-            _local_model = Llama(
-                model_path=LOCAL_MODEL_PATH,
-                n_ctx=1024,  # Smaller context for speed
-                n_threads=8,  # More threads for faster processing
-                n_gpu_layers=0,  # Set to higher number if you have GPU
-                n_batch=512,  # Larger batch size for speed
-                use_mmap=True,  # Memory mapping for faster loading
-                use_mlock=False  # Don't lock memory for speed
-            )
-            print(f"✅ Model loaded and cached successfully!")
-            return _local_model
-        else:
-            print(f"⚠️ Local model not found at: {LOCAL_MODEL_PATH}")
+    if _model_pool is not None:
+        return _model_pool
+    
+    with _model_pool_lock:
+        if _model_pool is not None:
+            return _model_pool
+        try:
+            if USE_LOCAL_MODEL and os.path.exists(LOCAL_MODEL_PATH):
+                pool = queue.Queue()
+                for _ in range(LLM_WORKERS):
+                    pool.put(load_local_model())
+                _model_pool = pool
+                print(f"✅ {LLM_WORKERS} model instance(s) loaded and cached successfully!")
+                return _model_pool
+            else:
+                print(f"⚠️ Local model not found at: {LOCAL_MODEL_PATH}")
+                return None
+        except Exception as e:
+            print(f"❌ Error loading local model: {e}")
             return None
-    except Exception as e:
-        print(f"❌ Error loading local model: {e}")
-        return None
+
+@contextmanager
+def local_model_slot():
+    """Borrow an idle model for one request, waiting for one to free up.
+    
+    Yields the Llama instance, or None when the local model is disabled or unavailable.
+    """
+    pool = get_model_pool() if USE_LOCAL_MODEL else None
+    if pool is None:
+        yield None
+        return
+    
+    model = pool.get()
+    try:
+        yield model
+    finally:
+        pool.put(model)
 
 @app.route('/')
 def index():
     """Main page with search and dataset catalogue"""
-    datasets = load_datasets()
+    datasets = get_catalogue()['datasets']
     return render_template('index.html', datasets=datasets)
 
 @app.route('/search')
@@ -74,175 +336,309 @@ def search():
     topic = request.args.get('topic', '')
     year = request.args.get('year', '')
     
-    datasets = load_datasets()
-    results = []
+    catalogue = get_catalogue()
+    datasets = catalogue['datasets']
+    search_fields = catalogue['search_fields']
     
-    for dataset in datasets:
-        # Keyword search
-        if query and query not in dataset['title'].lower() and query not in dataset['description'].lower():
-            continue
-            
-        # Filter by owner
-        if owner and owner != dataset['owner']:
-            continue
-            
-        # Filter by topic
-        if topic and topic != dataset['topic']:
-            continue
-            
-        # Filter by year
-        if year and year != str(dataset['year']):
-            continue
-            
-        results.append(dataset)
+    # Results depend only on the datasets and these parameters, so skip the search when the client has them
+    etag = hashlib.blake2b(f"{catalogue['etag']}\0{query}\0{owner}\0{topic}\0{year}".encode(), digest_size=16).hexdigest()
+    if etag_matches(etag):
+        return cacheable(Response(status=304), etag)
     
-    return jsonify(results)
+    # Filters are exact matches, so intersect their index sets (smallest first)
+    filter_sets = [index.get(value, set()) for index, value in ((catalogue['by_owner'], owner), (catalogue['by_topic'], topic), (catalogue['by_year'], year)) if value]
+    if filter_sets:
+        filter_sets.sort(key=len)
+        candidates = sorted(set.intersection(*filter_sets))
+    else:
+        candidates = range(len(datasets))
+    
+    # Keyword search on the surviving datasets only
+    if query:
+        candidates = [i for i in candidates if query in search_fields[i][0] or query in search_fields[i][1]]
+    
+    return cacheable(jsonify([datasets[i] for i in candidates]), etag)
 
 @app.route('/dataset/<int:dataset_id>')
 def dataset_detail(dataset_id):
     """Dataset detail page"""
-    datasets = load_datasets()
-    dataset = next((d for d in datasets if d['id'] == dataset_id), None)
+    dataset = get_dataset(dataset_id)
     
     if not dataset:
         return "Dataset not found", 404
         
     return render_template('dataset_detail.html', dataset=dataset)
 
+def openai_circuit_open():
+    """True while recent OpenAI fallbacks have all been failing"""
+    return (len(_openai_failures) == OPENAI_BREAKER_FAILURES
+            and time.monotonic() - _openai_failures[0] < OPENAI_BREAKER_WINDOW)
+
+def ask_openai(system_prompt, user_message):
+    """Answer with OpenAI, trying cheaper models first; None if unavailable"""
+    if _OAI_CLIENT is None:
+        return None
+    if openai_circuit_open():
+        print("⏭️ Skipping OpenAI: recent calls keep failing")
+        return None
+    
+    try:
+        print("🔄 Trying OpenAI as fallback...")
+        
+        # Try different models in order of preference
+        models_to_try = [m for m in ["gpt-3.5-turbo", "gpt-4o-mini", "gpt-4o"] if m not in _QUOTA_BANNED]
+        
+        for model in models_to_try:
+            try:
+                response = _OAI_CLIENT.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_message}
+                    ],
+                    max_tokens=OPENAI_MAX_TOKENS,
+                    temperature=0.7,
+                    stop=CHAT_STOP
+                )
+                print(f"✅ OpenAI model {model} successful")
+                _openai_failures.clear()
+                return response.choices[0].message.content
+            except Exception as e:
+                print(f"❌ OpenAI model {model} failed: {str(e)[:100]}...")
+                if "insufficient_quota" in str(e) or "quota" in str(e):
+                    _QUOTA_BANNED.add(model)
+                    continue
+                else:
+                    raise e
+                    
+    except Exception as e:
+        print(f"❌ OpenAI fallback failed: {e}")
+    _openai_failures.append(time.monotonic())
+    return None
+
+def fallback_response(datasets):
+    """Canned answer for when neither the local model nor OpenAI responded"""
+    return f"""I'm currently experiencing technical difficulties with my AI service. 
+
+However, I can still help you explore the {len(datasets)} available datasets! Here are some suggestions:
+
+• **Search by topic**: Try filtering by topics like 'Health', 'Environment', 'Economy', or 'Transport'
+• **Browse by owner**: Look for datasets from specific sources like 'Australian Bureau of Statistics' or 'Bureau of Meteorology'
+• **Use the search bar**: Type keywords related to your research needs
+
+For example, if you're looking for climate data, try filtering by topic 'Environment' and owner 'Bureau of Meteorology'.
+
+Please check back later for AI assistance, or contact support if you need immediate help."""
+
+def match_filters(message, catalogue):
+    """Dataset indexes matching a message made only of owner/topic/year values and filler words, else None.
+    
+    Values of the same field are OR-ed ("2020 2021"), different fields AND-ed ("ABS 2021").
+    """
+    filter_value_re = catalogue['filter_value_re']
+    found = defaultdict(set)
+    for match in filter_value_re.finditer(message):
+        for field, dataset_indexes in catalogue['filter_values'][match.group(0)]:
+            found[field] |= dataset_indexes
+    if not found:
+        return None
+    if any(word not in FILTER_FILLER_WORDS for word in tokenize(filter_value_re.sub(' ', message))):
+        return None
+    return sorted(set.intersection(*found.values())) or None
+
+def answer_without_model(user_message, catalogue):
+    """(response, dataset indexes) for messages the catalogue answers directly, else None"""
+    datasets = catalogue['datasets']
+    message = user_message.lower()
+    
+    if GREETING_RE.match(message):
+        return (
+            f"Hi! I can help you find datasets among the {len(datasets)} in the catalogue. "
+            "Ask about a subject (e.g. \"school enrolments by state\"), name an owner, topic or year, "
+            "or ask for a specific one like \"dataset 42\"."
+        ), []
+    
+    if LIST_ALL_RE.match(message):
+        return list_datasets(datasets, range(len(datasets)), f"The catalogue has {len(datasets)} datasets")
+    
+    match = DATASET_ID_RE.match(message)
+    if match:
+        dataset_id = match.group(5)
+        i = catalogue['index_by_id'].get(int(dataset_id))
+        if i is None:
+            return f"There is no dataset {dataset_id} in the catalogue.", []
+        return build_context_line(datasets[i]), [i]
+    
+    matches = match_filters(message, catalogue)
+    if matches:
+        return list_datasets(datasets, matches, f"Found {len(matches)} matching datasets")
+    
+    return None
+
+def list_datasets(datasets, indexes, heading):
+    """(response, shown indexes) listing the first INTENT_LIST_LIMIT of the given datasets"""
+    shown = list(indexes[:INTENT_LIST_LIMIT])
+    lines = [f"• Dataset {datasets[i]['id']}: {datasets[i]['title']}" for i in shown]
+    if len(indexes) > len(shown):
+        lines.append(f"…and {len(indexes) - len(shown)} more. Use the search filters to browse them all.")
+    return f"{heading}:\n\n" + "\n".join(lines), shown
+
 @app.route('/chat', methods=['POST'])
 def chat():
     """AI chat endpoint"""
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         user_message = data.get('message', '')
         
         if not user_message:
             return jsonify({'error': 'No message provided'}), 400
-            
-        # Load datasets for context
-        datasets = load_datasets()
-        
-        # Create context for AI
-        dataset_context = "\n\n".join([
-            f"Dataset {d['id']}: {d['title']} - {d['description']} "
-            f"(Owner: {d['owner']}, Topic: {d['topic']}, Year: {d['year']}, "
-            f"License: {d['license']}, Coverage: {d['coverage']})"
-            for d in datasets
-        ])
-        
-        # Create system prompt
-        system_prompt = f"""You are an AI assistant helping users discover Australian open datasets. 
-        You have access to the following {len(datasets)} datasets:
-        
-        {dataset_context}
         
-        Your role is to:
-        1. Help users understand what data they need
-        2. Recommend relevant datasets from the available inventory
-        3. Explain dataset metadata in simple terms
-        4. Always cite specific dataset IDs when making recommendations
+        # One catalogue for the whole request, even if the file is reloaded meanwhile
+        catalogue = get_catalogue()
+        datasets = catalogue['datasets']
         
-        Keep responses helpful, accurate, and focused on the available datasets."""
+        # Greetings, ID lookups and plain filters don't need the model
+        direct = answer_without_model(user_message, catalogue)
+        if direct:
+            return jsonify({'response': direct[0], 'relevant_datasets': [datasets[i] for i in direct[1]]})
+            
+        # Retrieve the few datasets relevant to the question instead of sending the whole catalogue
+        context_indexes = retrieve_datasets(user_message, catalogue)
+        system_prompt = build_system_prompt(context_indexes, catalogue)
         
         # Try local model first
         ai_response = None
         
         if USE_LOCAL_MODEL:
             print(f"🔍 USE_LOCAL_MODEL: {USE_LOCAL_MODEL}")
-            local_model = get_local_model()
-            print(f"🔍 Local model object: {local_model}")
             
-            if local_model:
-                try:
-                    print("🤖 Using local model for response...")
-                    prompt = f"{system_prompt}\n\nUser: {user_message}\n\nAssistant:"
-                    print(f"🔍 Prompt length: {len(prompt)} characters")
-                    
-                    # Use the exact working parameters from our test
-                    response = local_model(
-                        prompt,
-                        max_tokens=100,
-                        temperature=0.5
-                    )
-                    
-                    print(f"🔍 Raw response: {response}")
-                    
-                    if response and 'choices' in response and len(response['choices']) > 0:
-                        ai_response = response['choices'][0]['text'].strip()
-                        print(f"✅ Local model response successful: {ai_response[:100]}...")
-                    else:
-                        print("⚠️ Local model returned empty response")
-                        ai_response = None
-                        
-                except Exception as e:
-                    print(f"❌ Local model error: {e}")
-                    print(f"🔍 Error type: {type(e).__name__}")
-                    import traceback
-                    traceback.print_exc()
-                    ai_response = None
-            else:
-                print("⚠️ Local model is None")
-        
-        # Fallback to OpenAI if local model failed or not available
-        if not ai_response and openai.api_key:
-            try:
-                print("🔄 Trying OpenAI as fallback...")
-                client = openai.OpenAI(api_key=openai.api_key)
+            with local_model_slot() as local_model:
+                print(f"🔍 Local model object: {local_model}")
                 
-                # Try different models in order of preference
-                models_to_try = ["gpt-3.5-turbo", "gpt-4o-mini", "gpt-4o"]
-                
-                for model in models_to_try:
+                if local_model:
                     try:
-                        response = client.chat.completions.create(
-                            model=model,
-                            messages=[
-                                {"role": "system", "content": system_prompt},
-                                {"role": "user", "content": user_message}
-                            ],
-                            max_tokens=500,
-                            temperature=0.7
+                        print("🤖 Using local model for response...")
+                        prompt = f"{system_prompt}\n\nUser: {user_message}\n\nAssistant:"
+                        print(f"🔍 Prompt length: {len(prompt)} characters")
+                        
+                        # llama-cpp only evaluates the tokens after the longest cached prefix,
+                        # which is at least the preamble once the instance has served a request
+                        response = local_model(
+                            prompt,
+                            max_tokens=LOCAL_MAX_TOKENS,
+                            temperature=0.5,
+                            stop=CHAT_STOP
                         )
-                        ai_response = response.choices[0].message.content
-                        print(f"✅ OpenAI model {model} successful")
-                        break
-                    except Exception as e:
-                        print(f"❌ OpenAI model {model} failed: {str(e)[:100]}...")
-                        if "insufficient_quota" in str(e) or "quota" in str(e):
-                            continue
+                        
+                        print(f"🔍 Raw response: {response}")
+                        
+                        if response and 'choices' in response and len(response['choices']) > 0:
+                            ai_response = response['choices'][0]['text'].strip()
+                            print(f"✅ Local model response successful: {ai_response[:100]}...")
                         else:
-                            raise e
+                            print("⚠️ Local model returned empty response")
+                            ai_response = None
                             
-            except Exception as e:
-                print(f"❌ OpenAI fallback failed: {e}")
+                    except Exception as e:
+                        print(f"❌ Local model error: {e}")
+                        print(f"🔍 Error type: {type(e).__name__}")
+                        import traceback
+                        traceback.print_exc()
+                        ai_response = None
+                else:
+                    print("⚠️ Local model is None")
+        
+        # Fallback to OpenAI if local model failed or not available
+        if not ai_response:
+            ai_response = ask_openai(system_prompt, user_message)
         
         # Final fallback if both local and OpenAI failed
         if not ai_response:
-            ai_response = f"""I'm currently experiencing technical difficulties with my AI service. 
-
-However, I can still help you explore the {len(datasets)} available datasets! Here are some suggestions:
-
-• **Search by topic**: Try filtering by topics like 'Health', 'Environment', 'Economy', or 'Transport'
-• **Browse by owner**: Look for datasets from specific sources like 'Australian Bureau of Statistics' or 'Bureau of Meteorology'
-• **Use the search bar**: Type keywords related to your research needs
-
-For example, if you're looking for climate data, try filtering by topic 'Environment' and owner 'Bureau of Meteorology'.
-
-Please check back later for AI assistance, or contact support if you need immediate help."""
+            ai_response = fallback_response(datasets)
         
         return jsonify({
             'response': ai_response,
-            'datasets': datasets
+            'relevant_datasets': [datasets[i] for i in context_indexes]
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def sse_event(payload):
+    """Format a payload as one server-sent event"""
+    return f"data: {json.dumps(payload)}\n\n"
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """Streaming AI chat endpoint (server-sent events).
+    
+    Emits {"delta": text} events as the local model generates, then a final
+    {"done": true, "response": ..., "relevant_datasets": [...]} event.
+    """
+    data = request.get_json(silent=True) or {}
+    user_message = data.get('message', '')
+    
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    catalogue = get_catalogue()
+    datasets = catalogue['datasets']
+    
+    direct = answer_without_model(user_message, catalogue)
+    if direct:
+        event = sse_event({'done': True, 'response': direct[0], 'relevant_datasets': [datasets[i] for i in direct[1]]})
+        return Response(sse_event({'delta': direct[0]}) + event, mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache'})
+    
+    context_indexes = retrieve_datasets(user_message, catalogue)
+    system_prompt = build_system_prompt(context_indexes, catalogue)
+    relevant_datasets = [datasets[i] for i in context_indexes]
+    
+    def generate():
+        # Stream tokens from the local model as they are generated
+        chunks = []
+        with local_model_slot() as local_model:
+            if local_model:
+                try:
+                    prompt = f"{system_prompt}\n\nUser: {user_message}\n\nAssistant:"
+                    for chunk in local_model(prompt, max_tokens=LOCAL_MAX_TOKENS, temperature=0.5, stop=CHAT_STOP, stream=True):
+                        text = chunk['choices'][0]['text']
+                        if text:
+                            chunks.append(text)
+                            yield sse_event({'delta': text})
+                except Exception as e:
+                    print(f"❌ Local model streaming error: {e}")
+        ai_response = ''.join(chunks).strip()
+        
+        # OpenAI / canned fallbacks arrive as a single delta
+        if not ai_response:
+            ai_response = ask_openai(system_prompt, user_message) or fallback_response(datasets)
+            yield sse_event({'delta': ai_response})
+        
+        yield sse_event({
+            'done': True,
+            'response': ai_response,
+            'relevant_datasets': relevant_datasets
+        })
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
 @app.route('/api/datasets')
 def api_datasets():
     """API endpoint to get all datasets"""
-    datasets = load_datasets()
-    return jsonify(datasets)
+    catalogue = get_catalogue()
+    if etag_matches(catalogue['etag']):
+        return cacheable(Response(status=304), catalogue['etag'])
+    return cacheable(Response(catalogue['json'], mimetype='application/json'), catalogue['etag'])
+
+get_catalogue()
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    if os.getenv('FLASK_DEBUG', '').lower() in ('1', 'true'):
+        app.run(debug=True)
+    else:
+        # Production WSGI server: one process (the model is in-process), threads for concurrent requests
+        from waitress import serve
+        print("🚀 Serving with waitress on http://127.0.0.1:5000")
+        serve(app, host='127.0.0.1', port=5000, threads=8)
@@ -1,15 +1,28 @@
 #!/usr/bin/env python3
-import sys, json, argparse, re
+import sys, argparse, re, threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urlparse, urlencode, urlsplit, urlunsplit, parse_qs
-import urllib.request
+
+import orjson
+from requests.adapters import HTTPAdapter
+from requests_cache import CachedSession
 
 YEAR_RE = re.compile(r"\b(19|20|21)\d{2}\b")
+PAGE_WORKERS = 8
+# In-flight requests allowed per CKAN host, however many URLs/pages are being fetched at once
+MAX_REQUESTS_PER_HOST = 8
+
+WS_RE = re.compile(r"\s+")
+
+_host_slots = defaultdict(lambda: threading.Semaphore(MAX_REQUESTS_PER_HOST))
+_host_slots_lock = threading.Lock()
 
 def clean(s):
     if not s:
         return ""
-    return " ".join(str(s).split()).strip()
+    return WS_RE.sub(" ", str(s)).strip()
 
 def ext_from_url(u: str) -> str | None:
     try:
@@ -146,20 +159,46 @@ def transform_package(pkg, *, drop_if_empty_types=True, row_id=None):
         "data_types": data_types or "",
     }
 
+# One keep-alive session for every fetch. Worker threads come and go with each
+# pool, so per-thread sessions would throw their connections away; the adapter's
+# per-host connection pools are thread-safe and as big as the per-host request cap.
+# API pages are cached on disk: an hour fresh, then ETag/Last-Modified revalidation.
+HTTP_CACHE_NAME = ".ckan_cache"
+HTTP_CACHE_SECONDS = 3600
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> CachedSession:
+    """The shared session, created on first use so importing this module writes no cache file."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = CachedSession(cache_name=HTTP_CACHE_NAME, backend="sqlite", expire_after=HTTP_CACHE_SECONDS, cache_control=True)
+            _session.headers["User-Agent"] = "ckan2spider/1.0"
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=MAX_REQUESTS_PER_HOST)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+def host_slot(u: str) -> threading.Semaphore:
+    with _host_slots_lock:
+        return _host_slots[urlsplit(u).netloc]
+
 def fetch_url(u: str) -> str:
-    req = urllib.request.Request(u, headers={"User-Agent": "ckan2spider/1.0"})
-    with urllib.request.urlopen(req) as r:
-        return r.read().decode("utf-8", errors="replace")
+    with host_slot(u):
+        r = get_session().get(u, timeout=60)
+    r.raise_for_status()
+    return r.content.decode("utf-8", errors="replace")
 
 def load_json_any(path_or_dash: str):
     # Supports stdin, http(s), or local file
     if path_or_dash == "-":
-        text = sys.stdin.read()
+        text = sys.stdin.buffer.read()
     elif path_or_dash.startswith("http://") or path_or_dash.startswith("https://"):
         text = fetch_url(path_or_dash)
     else:
-        text = Path(path_or_dash).read_text(encoding="utf-8")
-    return json.loads(text)
+        text = Path(path_or_dash).read_bytes()
+    return orjson.loads(text)
 
 def ckan_results_from_page(data: dict) -> tuple[list[dict], int | None]:
     if not isinstance(data, dict) or "result" not in data or "results" not in data["result"]:
@@ -176,29 +215,52 @@ def update_query(url: str, **params) -> str:
     new_query = urlencode(q, doseq=True)
     return urlunsplit((parts.scheme, parts.netloc, parts.path, new_query, parts.fragment))
 
-def fetch_all_pages(base_url: str) -> list[dict]:
-    """Fetch all pages given a package_search URL containing rows & start."""
+def iter_all_pages(base_url: str):
+    """Yield the packages of every page, in order, given a package_search URL containing rows & start."""
     data = load_json_any(base_url)
     results, total = ckan_results_from_page(data)
+    yield from results
     if total is None:
-        return results
+        return
 
     parts = urlsplit(base_url)
     params = parse_qs(parts.query, keep_blank_values=True)
     rows = int(params.get("rows", ["100"])[0])
     start = int(params.get("start", ["0"])[0])
 
-    got = len(results)
-    while got < total:
-        start += rows
-        page_url = update_query(base_url, start=start)
-        page_data = load_json_any(page_url)
-        page_results, _ = ckan_results_from_page(page_data)
-        if not page_results:
-            break
-        results.extend(page_results)
-        got += len(page_results)
-    return results
+    # The total is known now, so every remaining page can be requested at once
+    page_urls = [update_query(base_url, start=s) for s in range(start + rows, start + total, rows)] if rows > 0 else []
+    with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as executor:
+        pages = executor.map(lambda u: ckan_results_from_page(load_json_any(u))[0], page_urls)
+        for page_results in pages:
+            if not page_results:
+                break
+            yield from page_results
+
+def fetch_all_pages(base_url: str) -> list[dict]:
+    """Fetch all pages given a package_search URL containing rows & start."""
+    return list(iter_all_pages(base_url))
+
+def transform_packages(pkgs, *, drop_if_empty_types=True, start_id=1):
+    """Yield transformed rows, numbering only the rows that are kept."""
+    current_id = start_id
+    for pkg in pkgs:
+        row = transform_package(pkg, drop_if_empty_types=drop_if_empty_types, row_id=current_id)
+        if row is not None:
+            yield row
+            current_id += 1  # increment only when kept
+
+def write_json_array(path: str, rows) -> int:
+    """Write rows as an indented JSON array one row at a time; returns the row count."""
+    count = 0
+    with open(path, "wb") as f:
+        for row in rows:
+            f.write(b"[\n  " if count == 0 else b",\n  ")
+            # Newlines inside strings are escaped, so every raw newline is indentation
+            f.write(orjson.dumps(row, option=orjson.OPT_INDENT_2).replace(b"\n", b"\n  "))
+            count += 1
+        f.write(b"\n]" if count else b"[]")
+    return count
 
 def main():
     ap = argparse.ArgumentParser(description="Convert CKAN package_search JSON (URL/file/stdin) to spider-style JSON.")
@@ -212,7 +274,7 @@ def main():
     # Get package list
     if args.input.startswith("http://") or args.input.startswith("https://"):
         if args.all:
-            pkgs = fetch_all_pages(args.input)
+            pkgs = iter_all_pages(args.input)
         else:
             data = load_json_any(args.input)
             pkgs, _ = ckan_results_from_page(data)
@@ -226,16 +288,10 @@ def main():
             print("Unrecognized input structure: expected CKAN package_search JSON.", file=sys.stderr)
             sys.exit(2)
 
-    out = []
-    current_id = args.start_id
-    for pkg in pkgs:
-        row = transform_package(pkg, drop_if_empty_types=not args.keep_empty, row_id=current_id)
-        if row is not None:
-            out.append(row)
-            current_id += 1  # increment only when kept
-
-    Path(args.output).write_text(json.dumps(out, ensure_ascii=False, indent=2), encoding="utf-8")
-    print(f"Wrote {len(out)} records to {args.output}")
+    # Rows are written as they are transformed (and, with --all, as pages arrive)
+    rows = transform_packages(pkgs, drop_if_empty_types=not args.keep_empty, start_id=args.start_id)
+    count = write_json_array(args.output, rows)
+    print(f"Wrote {count} records to {args.output}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+import argparse
+from pathlib import Path
+
+import orjson
+import ormsgpack
+
+
+def main():
+    ap = argparse.ArgumentParser(
+        description="Convert datasets.json to MessagePack. The app loads datasets.msgpack in preference "
+                    "to datasets.json unless the JSON file is newer."
+    )
+    ap.add_argument("input", nargs="?", default="datasets.json", help="Dataset JSON file (default: datasets.json)")
+    ap.add_argument("-o", "--output", default="datasets.msgpack", help="Output file (default: datasets.msgpack)")
+    args = ap.parse_args()
+
+    datasets = orjson.loads(Path(args.input).read_bytes())
+    Path(args.output).write_bytes(ormsgpack.packb(datasets))
+    print(f"Wrote {len(datasets)} records to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
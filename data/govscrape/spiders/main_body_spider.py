@@ -3,10 +3,10 @@ from __future__ import annotations
 
 import re
 from pathlib import Path
-from urllib.parse import urljoin, urlparse
 
 import scrapy
-from parsel import Selector
+from lxml import etree
+from parsel.csstranslator import css2xpath
 from w3lib.html import remove_tags, replace_entities
 
 
@@ -16,13 +16,67 @@ KNOWN_EXTS = {
     "csv", "tsv", "xlsx", "xls", "json", "xml", "rdf", "geojson",
     "zip", "pdf", "doc", "docx", "ppt", "pptx"
 }
+# Normalize known ext aliases
+NORM_MAP = {
+    "htm": "html",
+}
+# Scheme + host part of an absolute or protocol-relative href (the host's TLD is not an extension)
+AUTHORITY_RE = re.compile(r"^(?:[a-z][a-z0-9+.\-]*:)?//[^/]*", re.I)
+# 1-5 char extension at the end of a URL path, ignoring trailing punctuation ("report.csv)")
+EXT_RE = re.compile(r"\.([a-z0-9]{1,5})[^a-z0-9.]*$", re.I)
+TYPE_CLASS_RE = re.compile(r"type-([a-z0-9]+)")
+
+
+def _css(query: str) -> etree.XPath:
+    # Compile once with the same CSS->XPath translation parsel would redo on every .css() call
+    return etree.XPath(css2xpath(query))
+
+
+# Typical main content containers seen on gov sites/Drupal, in order of preference
+XP_MAIN_CONTAINERS = [_css(q) for q in (
+    "main#main-content",
+    "#main-content",
+    "main[role='main']",
+    "article.node",
+    "article[role='article']",
+    "article",
+    "div[role='main']",
+    "section.section .region-content",
+    ".region.region-content",
+)]
+XP_H1_TEXT = _css("h1::text")
+XP_TITLE_TEXT = _css("title::text")
+XP_INTRO = _css(".field--name-field-intro, .node-intro")
+XP_DETAILS = _css("dl.details")
+XP_DT = _css("dt")
+XP_DD = _css("dd")
+XP_PUBLISHER_TEXT = _css(".field--name-field-publication-publisher ::text")
+XP_TAG_TEXT = _css(".field--name-field-tags a::text")
+XP_TIME = _css("time::attr(datetime), time::text")
+XP_LICENSE_TEXT = _css(".field--name-field-license ::text")
+XP_COVERAGE_TEXT = _css(".field--name-field-publication-coverage ::text")
+XP_PREVIEW = _css(".field--name-field-intro, .node-intro, .summary, .description")
+XP_PARAGRAPH = _css("p")
+XP_ANCHORS = _css("a")
 
 
 class MainBodySpider(scrapy.Spider):
     name = "main_body"
 
     custom_settings = {
-        # Keep smallish default concurrency; obey robots from settings.py/run script
+        # Crawls are network-bound: overlap requests, let AutoThrottle back off
+        # per host (DOWNLOAD_DELAY from settings.py stays the floor); obey robots
+        # from settings.py/run script
+        "TWISTED_REACTOR": "twisted.internet.asyncioreactor.AsyncioSelectorReactor",
+        "CONCURRENT_REQUESTS": 32,
+        "CONCURRENT_REQUESTS_PER_DOMAIN": 16,
+        "REACTOR_THREADPOOL_MAXSIZE": 20,
+        "AUTOTHROTTLE_ENABLED": True,
+        "AUTOTHROTTLE_TARGET_CONCURRENCY": 8.0,
+        "DNS_RESOLVER": "scrapy.resolver.CachingThreadedResolver",
+        # Re-crawls within a day are served from .scrapy/httpcache, not the network
+        "HTTPCACHE_ENABLED": True,
+        "HTTPCACHE_EXPIRATION_SECS": 86400,
         "DOWNLOAD_TIMEOUT": 30,
         "FEED_EXPORT_ENCODING": "utf-8",
         # Avoid being blocked by trivial duplicate filtering when anchors differ
@@ -51,28 +105,39 @@ class MainBodySpider(scrapy.Spider):
     # --------------------
     # Helpers
     # --------------------
-    def _sel(self, response: scrapy.http.Response) -> Selector | None:
+    def _sel(self, response: scrapy.http.Response) -> list:
         """
-        Return a Selector scoping to the main content area if possible.
+        Return the lxml element(s) of the main content area if possible.
         Try typical main containers seen on gov sites/Drupal.
         """
-        sel = response.selector
+        root = response.selector.root
         # Prefer explicit main content region
-        for css in [
-            "main#main-content",
-            "#main-content",
-            "main[role='main']",
-            "article.node",
-            "article[role='article']",
-            "article",
-            "div[role='main']",
-            "section.section .region-content",
-            ".region.region-content",
-        ]:
-            nodes = sel.css(css)
+        for xpath in XP_MAIN_CONTAINERS:
+            nodes = xpath(root)
             if nodes:
                 return nodes
-        return sel  # fallback to full page
+        return [root]  # fallback to full page
+
+    @staticmethod
+    def _select(xpath: etree.XPath, container: list) -> list:
+        # Run a compiled query against every container element, like SelectorList.css()
+        return [r for element in container for r in xpath(element)]
+
+    @staticmethod
+    def _html(node) -> str:
+        # Serialize a result the way parsel's Selector.get() does
+        if isinstance(node, str):
+            return str(node)
+        return etree.tostring(node, method="html", encoding="unicode", with_tail=False)
+
+    @staticmethod
+    def _first(xpath: etree.XPath, container: list) -> str | None:
+        results = MainBodySpider._select(xpath, container)
+        return MainBodySpider._html(results[0]) if results else None
+
+    @staticmethod
+    def _texts(xpath: etree.XPath, container: list) -> list[str]:
+        return [str(t) for t in MainBodySpider._select(xpath, container)]
 
     @staticmethod
     def _clean_text(html_text: str) -> str:
@@ -91,71 +156,51 @@ class MainBodySpider(scrapy.Spider):
 
     @staticmethod
     def _ext_from_href(href: str) -> str | None:
-        try:
-            path = urlparse(href).path.lower()
-            if "." in path:
-                ext = path.rsplit(".", 1)[-1]
-                # Strip trailing punctuation or query-styled remnants
-                ext = re.sub(r"[^a-z0-9]+$", "", ext)
-                if 1 <= len(ext) <= 5 and ext.isalnum():
-                    return ext
-        except Exception:
-            pass
-        return None
+        # Only the path's extension matters, so no need to resolve the href against the page URL
+        path = AUTHORITY_RE.sub("", href.split("#", 1)[0].split("?", 1)[0], count=1)
+        m = EXT_RE.search(path)
+        return m.group(1).lower() if m else None
 
     @staticmethod
-    def _collect_data_types_from_links(container: Selector, base_url: str) -> set[str]:
+    def _collect_data_types_from_links(container: list, base_url: str) -> set[str]:
         exts: set[str] = set()
+        # Query/fragment-only hrefs point at the page itself
+        base_ext = MainBodySpider._ext_from_href(base_url)
+
+        for a in MainBodySpider._select(XP_ANCHORS, container):
+            attrib = a.attrib
+
+            # <a class="file type-xlsx"> pattern: class may contain "type-xxx"
+            classes = attrib.get("class", "")
+            if "file" in classes.split():
+                exts.update(TYPE_CLASS_RE.findall(classes.lower()))
 
-        # 1) <a class="file type-xlsx"> pattern
-        for a in container.css("a.file"):
-            classes = " ".join(a.attrib.get("class", "").lower().split())
-            # Class may contain "type-xxx"
-            for m in re.finditer(r"type-([a-z0-9]+)", classes):
-                exts.add(m.group(1))
-
-            href = a.attrib.get("href")
-            if href:
-                abs_url = urljoin(base_url, href)
-                ext = MainBodySpider._ext_from_href(abs_url)
-                if ext:
-                    exts.add(ext)
-
-        # 2) Any links that look like files by extension
-        for a in container.css("a[href]"):
-            href = a.attrib.get("href")
+            # Any links that look like files by extension
+            href = attrib.get("href")
             if not href:
                 continue
-            abs_url = urljoin(base_url, href)
-            ext = MainBodySpider._ext_from_href(abs_url)
+            href = href.strip()
+            ext = base_ext if not href or href[0] in "?#" else MainBodySpider._ext_from_href(href)
             if ext:
                 exts.add(ext)
 
-        # Normalize known ext aliases
-        norm_map = {
-            "htm": "html",
-        }
-        out = set()
-        for e in exts:
-            e = e.lower()
-            e = norm_map.get(e, e)
-            out.add(e)
+        out = {NORM_MAP.get(e, e) for e in exts}
         # Keep only known data-ish types if you want to exclude plain html
         # (If you prefer to include html/aspx too, comment next line out)
         # return {e for e in out if e in KNOWN_EXTS}
         return out
 
     @staticmethod
-    def _extract_title(container: Selector, fallback_sel: Selector) -> str:
-        title = container.css("h1::text").get()
+    def _extract_title(container: list, page_root) -> str:
+        title = MainBodySpider._first(XP_H1_TEXT, container)
         if not title:
-            title = fallback_sel.css("title::text").get()
+            title = MainBodySpider._first(XP_TITLE_TEXT, [page_root])
         return (title or "").strip()
 
     @staticmethod
-    def _extract_description(container: Selector) -> str:
+    def _extract_description(container: list) -> str:
         # Common Drupal intro field
-        intro = container.css(".field--name-field-intro, .node-intro").get()
+        intro = MainBodySpider._first(XP_INTRO, container)
         if intro:
             return MainBodySpider._clean_text(intro)
 
@@ -163,29 +208,33 @@ class MainBodySpider(scrapy.Spider):
         return ""
 
     @staticmethod
-    def _extract_owner(container: Selector) -> str:
+    def _parse_details(container: list) -> list[dict[str, str]]:
+        # <dl class="details"><dt>Creator</dt><dd>...</dd> etc.
+        # Map dt text -> dd text, one dict per <dl> in page order
+        details = []
+        for dl in MainBodySpider._select(XP_DETAILS, container):
+            dts = [MainBodySpider._clean_text(MainBodySpider._html(x)) for x in XP_DT(dl)]
+            dds = [MainBodySpider._clean_text(MainBodySpider._html(x)) for x in XP_DD(dl)]
+            details.append(dict(zip(dts, dds)))
+        return details
+
+    @staticmethod
+    def _extract_owner(container: list, details: list[dict[str, str]]) -> str:
         # Try details: Creator / Publisher fields
-        # <dt>Creator</dt><dd>...</dd> etc.
         owner = ""
-        dls = container.css("dl.details")
-        if dls:
-            # Map dt text -> dd text
-            for dl in dls:
-                dts = [MainBodySpider._clean_text(x) for x in dl.css("dt").getall()]
-                dds = [MainBodySpider._clean_text(x) for x in dl.css("dd").getall()]
-                mapping = dict(zip(dts, dds))
-                owner = mapping.get("Creator") or mapping.get("Publisher") or ""
-                if owner:
-                    break
+        for mapping in details:
+            owner = mapping.get("Creator") or mapping.get("Publisher") or ""
+            if owner:
+                break
         # Other common selector (publisher text blocks)
         if not owner:
-            owner = MainBodySpider._clean_text(" ".join(container.css(".field--name-field-publication-publisher ::text").getall()))
+            owner = MainBodySpider._clean_text(" ".join(MainBodySpider._texts(XP_PUBLISHER_TEXT, container)))
         return owner
 
     @staticmethod
-    def _extract_topic(container: Selector) -> str:
+    def _extract_topic(container: list) -> str:
         # Drupal taxonomy tags often live in .field--name-field-tags or breadcrumbs
-        tags = [t.strip() for t in container.css(".field--name-field-tags a::text").getall() if t.strip()]
+        tags = [t.strip() for t in MainBodySpider._texts(XP_TAG_TEXT, container) if t.strip()]
         if tags:
             # dedupe preserving order
             seen, out = set(), []
@@ -198,17 +247,14 @@ class MainBodySpider(scrapy.Spider):
         return ""
 
     @staticmethod
-    def _extract_year(title: str, container: Selector) -> str:
+    def _extract_year(title: str, container: list, details: list[dict[str, str]]) -> str:
         # 1) From title
         m = YEAR_RE.search(title or "")
         if m:
             return m.group(0)
 
         # 2) From details (Creation Date / Published)
-        for dl in container.css("dl.details"):
-            dts = [MainBodySpider._clean_text(x) for x in dl.css("dt").getall()]
-            dds = [MainBodySpider._clean_text(x) for x in dl.css("dd").getall()]
-            mapping = dict(zip(dts, dds))
+        for mapping in details:
             for key in ("Creation Date", "Published", "Publication date", "Date"):
                 val = mapping.get(key)
                 if val:
@@ -217,7 +263,7 @@ class MainBodySpider(scrapy.Spider):
                         return mm.group(0)
 
         # 3) From any time tags
-        for time in container.css("time::attr(datetime), time::text").getall():
+        for time in MainBodySpider._texts(XP_TIME, container):
             mm = YEAR_RE.search(time)
             if mm:
                 return mm.group(0)
@@ -225,33 +271,30 @@ class MainBodySpider(scrapy.Spider):
         return ""
 
     @staticmethod
-    def _extract_license(container: Selector) -> str:
+    def _extract_license(container: list) -> str:
         # Many pages won’t expose a license—leave blank if unknown
         # Try common license fields if present
-        lic = MainBodySpider._clean_text(" ".join(container.css(".field--name-field-license ::text").getall()))
+        lic = MainBodySpider._clean_text(" ".join(MainBodySpider._texts(XP_LICENSE_TEXT, container)))
         return lic
 
     @staticmethod
-    def _extract_coverage(container: Selector) -> str:
-        for dl in container.css("dl.details"):
-            dts = [MainBodySpider._clean_text(x) for x in dl.css("dt").getall()]
-            dds = [MainBodySpider._clean_text(x) for x in dl.css("dd").getall()]
-            mapping = dict(zip(dts, dds))
+    def _extract_coverage(container: list, details: list[dict[str, str]]) -> str:
+        for mapping in details:
             cov = mapping.get("Coverage") or ""
             if cov:
                 return cov
         # Alt field name
-        cov = MainBodySpider._clean_text(" ".join(container.css(".field--name-field-publication-coverage ::text").getall()))
+        cov = MainBodySpider._clean_text(" ".join(MainBodySpider._texts(XP_COVERAGE_TEXT, container)))
         return cov
 
     @staticmethod
-    def _extract_sample_preview(container: Selector) -> str:
+    def _extract_sample_preview(container: list) -> str:
         # Prefer intro/description; else grab first paragraph-ish text from main content
-        intro = container.css(".field--name-field-intro, .node-intro, .summary, .description").get()
+        intro = MainBodySpider._first(XP_PREVIEW, container)
         text = MainBodySpider._clean_text(intro) if intro else ""
         if not text:
             # fallback to first meaningful paragraph
-            para_html = container.css("p").get()
+            para_html = MainBodySpider._first(XP_PARAGRAPH, container)
             text = MainBodySpider._clean_text(para_html) if para_html else ""
         return text[:280]
 
@@ -262,13 +305,16 @@ class MainBodySpider(scrapy.Spider):
         base = response.url
         container = self._sel(response)
 
-        title = self._extract_title(container, response.selector)
+        # Parse the dt/dd detail lists once for the extractors that read them
+        details = self._parse_details(container)
+
+        title = self._extract_title(container, response.selector.root)
         description = self._extract_description(container)
-        owner = self._extract_owner(container)
+        owner = self._extract_owner(container, details)
         topic = self._extract_topic(container)
-        year = self._extract_year(title, container)
+        year = self._extract_year(title, container, details)
         license_text = self._extract_license(container)
-        coverage = self._extract_coverage(container)
+        coverage = self._extract_coverage(container, details)
         sample_preview = self._extract_sample_preview(container)
 
         # Data types from links within the main content area only
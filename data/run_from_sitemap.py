@@ -1,8 +1,12 @@
 #!/usr/bin/env python3
 import sys
+import atexit
 from pathlib import Path
 import tempfile
-import json
+from itertools import chain
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
 
 from sitemap_filter import (
     collect_urls_from_sitemap,
@@ -17,22 +21,40 @@ from ckan_to_spider_json import (
     load_json_any,
     ckan_results_from_page,
     transform_package,
+    write_json_array,
 )
 
 from scrapy.crawler import CrawlerProcess
 from scrapy.utils.project import get_project_settings
 from govscrape.spiders.main_body_spider import MainBodySpider
 
+# api_links.txt entries fetched at once (per-host limits live in ckan_to_spider_json)
+CKAN_URL_WORKERS = 16
+
 
 def _read_api_links(path: Path) -> list[str]:
     """Read non-empty, non-comment lines from api_links.txt"""
-    lines = []
-    for raw in path.read_text(encoding="utf-8").splitlines():
-        s = raw.strip()
-        if not s or s.startswith("#"):
-            continue
-        lines.append(s)
-    return lines
+    with path.open(encoding="utf-8") as f:
+        return [s for s in (line.strip() for line in f) if s and not s.startswith("#")]
+
+
+def _ckan_fetch(url: str) -> tuple[list[dict] | None, Exception | None]:
+    """Fetch one api_links entry; returns (packages, None), or (None, error) on failure."""
+    try:
+        # If it's clearly a CKAN URL, fetch pages; else try to load once.
+        if url.startswith("http://") or url.startswith("https://"):
+            # Prefer full pagination if URL has rows/start (works either way)
+            return fetch_all_pages(url), None
+        data = load_json_any(url)
+        if isinstance(data, dict):
+            pkgs, _ = ckan_results_from_page(data)
+            return pkgs, None
+        if isinstance(data, list):
+            return data, None
+        print(f"[ckan] Skipping unrecognized structure from: {url}")
+        return None, None
+    except Exception as e:
+        return None, e
 
 
 def _ckan_collect_all(api_urls: list[str], start_id: int) -> tuple[list[dict], int]:
@@ -40,26 +62,28 @@ def _ckan_collect_all(api_urls: list[str], start_id: int) -> tuple[list[dict], i
     For each CKAN package_search URL, fetch all pages (respects rows/start in URL),
     transform into target schema, and assign IDs starting from start_id.
     Returns (rows, next_id).
+
+    URLs are fetched concurrently, but transformed in api_links order so IDs are reproducible.
+    A package returned more than once (overlapping pages, repeated links) is kept the first time.
     """
     out = []
     current_id = start_id
-    for url in api_urls:
+    seen_pkg_ids: set[str] = set()
+    with ThreadPoolExecutor(max_workers=CKAN_URL_WORKERS) as executor:
+        fetched = list(executor.map(_ckan_fetch, api_urls))
+    for url, (pkgs, error) in zip(api_urls, fetched):
+        if error is not None:
+            print(f"[ckan] Error processing {url}: {error}")
+            continue
+        if pkgs is None:
+            continue
         try:
-            # If it's clearly a CKAN URL, fetch pages; else try to load once.
-            if url.startswith("http://") or url.startswith("https://"):
-                # Prefer full pagination if URL has rows/start (works either way)
-                pkgs = fetch_all_pages(url)
-            else:
-                data = load_json_any(url)
-                if isinstance(data, dict):
-                    pkgs, _ = ckan_results_from_page(data)
-                elif isinstance(data, list):
-                    pkgs = data
-                else:
-                    print(f"[ckan] Skipping unrecognized structure from: {url}")
-                    continue
-
             for pkg in pkgs:
+                pid = pkg.get("id")
+                if pid is not None:
+                    if pid in seen_pkg_ids:
+                        continue
+                    seen_pkg_ids.add(pid)
                 row = transform_package(pkg, drop_if_empty_types=True, row_id=current_id)
                 if row is not None:
                     out.append(row)
@@ -71,6 +95,26 @@ def _ckan_collect_all(api_urls: list[str], start_id: int) -> tuple[list[dict], i
     return out, current_id
 
 
+def _iter_json_lines(path: Path):
+    """Yield the records of a JSON Lines file one at a time."""
+    with path.open("rb") as f:
+        for line in f:
+            if line.strip():
+                yield orjson.loads(line)
+
+
+def _dedupe_by_source_url(rows):
+    """Yield rows whose source_url hasn't been seen yet (rows without one are always kept)."""
+    seen_urls = set()
+    for row in rows:
+        key = row.get("source_url")
+        if key:
+            if key in seen_urls:
+                continue
+            seen_urls.add(key)
+        yield row
+
+
 def run_pipeline(
     sitemap_url: str,
     *,
@@ -79,6 +123,8 @@ def run_pipeline(
     keywords=None,
     output: str = "datasets.json",
     api_links_file: str = "api_links.txt",
+    concurrency: int = 256,
+    per_domain: int = 16,
 ):
     # -------------------------------
     # 0) CKAN side: collect + transform with sequential IDs
@@ -100,24 +146,28 @@ def run_pipeline(
     # -------------------------------
     # 1) Sitemap filter for spider URLs
     # -------------------------------
-    urls = collect_urls_from_sitemap(sitemap_url)
-    urls = dedupe_preserve_order(urls)
+    urls = dedupe_preserve_order(collect_urls_from_sitemap(sitemap_url))
     kws = keywords or DEFAULT_KEYWORDS
-    filtered = filter_by_keywords(urls, kws)
+    filtered = list(filter_by_keywords(urls, kws))
 
     if not filtered:
         print("No matching URLs found after filtering.")
         # Even if no spider URLs, still write CKAN output if any
-        Path(output).write_text(json.dumps(ckan_rows, ensure_ascii=False, indent=2), encoding="utf-8")
-        print(f"[final] Wrote {len(ckan_rows)} records to {output}")
+        count = write_json_array(output, ckan_rows)
+        print(f"[final] Wrote {count} records to {output}")
         return
 
     # Write start URLs for spider
-    tmp_urls_file = Path(tempfile.mkstemp(suffix=".txt")[1])
-    tmp_urls_file.write_text("\n".join(filtered), encoding="utf-8")
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as tf:
+        tf.writelines(u + "\n" for u in filtered)
+    tmp_urls_file = Path(tf.name)
+    atexit.register(tmp_urls_file.unlink, missing_ok=True)
 
-    # Temporary spider output
-    tmp_spider_json = Path(tempfile.mkstemp(suffix=".json")[1])
+    # Temporary spider output (Scrapy reopens it by name)
+    with tempfile.NamedTemporaryFile(suffix=".jsonl", delete=False) as tf:
+        pass
+    tmp_spider_jsonl = Path(tf.name)
+    atexit.register(tmp_spider_jsonl.unlink, missing_ok=True)
 
     # -------------------------------
     # 2) Configure Scrapy run (spider continues IDs from next_id)
@@ -127,8 +177,9 @@ def run_pipeline(
     settings.set(
         "FEEDS",
         {
-            str(tmp_spider_json): {
-                "format": "json",
+            # JSON Lines: each item is written as it is scraped, not held for a closing "]"
+            str(tmp_spider_jsonl): {
+                "format": "jsonlines",
                 "encoding": "utf8",
                 "overwrite": True,
             }
@@ -146,6 +197,20 @@ def run_pipeline(
     settings.set("ROBOTSTXT_OBEY", True, priority="cmdline")
     settings.set("FEED_EXPORT_ENCODING", "utf-8", priority="cmdline")
 
+    # Broad-crawl tuning: filtered URLs usually span many hosts, so allow plenty of
+    # requests overall and schedule toward the hosts with the fewest in flight
+    # (AutoThrottle in the spider still backs off per host)
+    settings.set("SCHEDULER_PRIORITY_QUEUE", "scrapy.pqueues.DownloaderAwarePriorityQueue", priority="cmdline")
+    settings.set("CONCURRENT_REQUESTS", concurrency, priority="cmdline")
+    settings.set("CONCURRENT_REQUESTS_PER_DOMAIN", per_domain, priority="cmdline")
+    settings.set("REACTOR_THREADPOOL_MAXSIZE", 40, priority="cmdline")
+    settings.set("DNSCACHE_ENABLED", True, priority="cmdline")
+    settings.set("DNSCACHE_SIZE", 500000, priority="cmdline")
+    settings.set("DNS_TIMEOUT", 5, priority="cmdline")
+    settings.set("DOWNLOAD_TIMEOUT", 30, priority="cmdline")
+    settings.set("RETRY_TIMES", 1, priority="cmdline")
+    settings.set("HTTPCOMPRESSION_ENABLED", True, priority="cmdline")
+
     process = CrawlerProcess(settings)
     # Pass urls_file and start_id so the spider can assign IDs
     process.crawl(MainBodySpider, urls_file=str(tmp_urls_file), start_id=next_id)
@@ -154,16 +219,18 @@ def run_pipeline(
     # -------------------------------
     # 3) Merge CKAN rows + spider rows into final output
     # -------------------------------
-    spider_rows = []
-    try:
-        if tmp_spider_json.exists():
-            spider_rows = json.loads(tmp_spider_json.read_text(encoding="utf-8"))
-    except Exception as e:
-        print(f"[merge] Could not read spider output: {e}")
+    def spider_rows():
+        # Streamed straight into the output, so a broken feed keeps the rows before the damage
+        try:
+            if tmp_spider_jsonl.exists():
+                yield from _iter_json_lines(tmp_spider_jsonl)
+        except Exception as e:
+            print(f"[merge] Could not read spider output: {e}")
 
-    combined = ckan_rows + (spider_rows or [])
-    Path(output).write_text(json.dumps(combined, ensure_ascii=False, indent=2), encoding="utf-8")
-    print(f"[final] Wrote {len(combined)} records to {output}")
+    # A page scraped by the spider may be the same dataset CKAN already returned;
+    # the CKAN row comes first, so it is the one kept
+    count = write_json_array(output, _dedupe_by_source_url(chain(ckan_rows, spider_rows())))
+    print(f"[final] Wrote {count} records to {output}")
 
 
 def _parse_args(argv):
@@ -199,6 +266,18 @@ def _parse_args(argv):
         default="api_links.txt",
         help="Path to a file containing CKAN package_search URLs (default: api_links.txt)",
     )
+    p.add_argument(
+        "--concurrency",
+        type=int,
+        default=256,
+        help="Scrapy CONCURRENT_REQUESTS across all hosts (default: 256)",
+    )
+    p.add_argument(
+        "--per-domain",
+        type=int,
+        default=16,
+        help="Scrapy CONCURRENT_REQUESTS_PER_DOMAIN; lower it for single-host runs (default: 16)",
+    )
     return p.parse_args(argv)
 
 
@@ -216,4 +295,6 @@ if __name__ == "__main__":
         keywords=kws,
         output=args.output,
         api_links_file=args.api_links,
+        concurrency=args.concurrency,
+        per_domain=args.per_domain,
     )
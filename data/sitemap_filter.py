@@ -1,7 +1,48 @@
 #!/usr/bin/env python3
-import sys, argparse, gzip, urllib.request, urllib.parse, xml.etree.ElementTree as ET
+import sys, argparse, gzip, hashlib, io, json, os, re, tempfile, threading, urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from contextlib import ExitStack, closing, contextmanager
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import Iterable, Iterator
+
+import requests
+from lxml import etree
+from requests.adapters import HTTPAdapter
 
 NS = {"sm": "http://www.sitemaps.org/schemas/sitemap/0.9"}
+LOC_TAG = f"{{{NS['sm']}}}loc"
+# <loc> parents: page entries of a urlset, child sitemaps of a sitemapindex
+LOC_PARENT_TAGS = {f"{{{NS['sm']}}}url": "url", f"{{{NS['sm']}}}sitemap": "sitemap"}
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Keep-alive session shared by the index and its child sitemaps (usually one host);
+# requests sends Accept-Encoding: gzip, deflate itself. Not a caching session: a cache
+# stores the whole body before handing it over, which would undo the streaming parse.
+# Re-runs are saved a download by conditional GETs against SITEMAP_CACHE_DIR instead.
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """The shared session, created on first use so importing this module has no side effects."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.headers["User-Agent"] = "sitemap-filter/1.0"
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+# Bodies of sitemaps that came with an ETag/Last-Modified, written to disk as they stream in.
+# The next fetch sends those validators, and a 304 is answered from the saved copy.
+SITEMAP_CACHE_DIR = Path(".sitemap_cache")
+
+# Child sitemaps of an index downloaded at once (and how far ahead of the consumer they run)
+SITEMAP_WORKERS = 8
 
 # Default keywords that commonly indicate data endpoints/resources
 DEFAULT_KEYWORDS = [
@@ -18,71 +59,184 @@ DEFAULT_KEYWORDS = [
     "json", "xml", "csv", "rdf", "geojson", "xlsx"
 ]
 
-def fetch_bytes(url: str) -> bytes:
-    req = urllib.request.Request(url, headers={"User-Agent": "sitemap-filter/1.0"})
-    with urllib.request.urlopen(req) as r:
-        data = r.read()
-        enc = r.headers.get("Content-Encoding", "")
-        if url.endswith(".gz") or "gzip" in enc.lower():
-            try:
-                import gzip as _gzip
-                return _gzip.decompress(data)
-            except OSError:
-                pass  # not actually gzipped
-        return data
-
-def parse_xml_bytes(b: bytes) -> ET.Element:
-    return ET.fromstring(b)
-
-def collect_urls_from_sitemap(url: str) -> list[str]:
-    """Returns all <loc> URLs from a sitemap or sitemap index (recursively, 1 level)."""
-    root = parse_xml_bytes(fetch_bytes(url))
-    urls = []
-
-    # urlset
-    for loc in root.findall(".//sm:url/sm:loc", NS):
-        if loc.text:
-            urls.append(loc.text.strip())
+class _ChunkReader(io.RawIOBase):
+    """Read-only file object over an iterator of byte chunks."""
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buf = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buf:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._buf = chunk
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+def _cache_paths(url: str) -> tuple[Path, Path]:
+    """(body, validators) files of a sitemap's cache entry."""
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return SITEMAP_CACHE_DIR / f"{key}.body", SITEMAP_CACHE_DIR / f"{key}.json"
+
+def cached_validators(url: str) -> dict[str, str]:
+    """If-None-Match / If-Modified-Since headers for a sitemap saved by an earlier run."""
+    body_path, meta_path = _cache_paths(url)
+    try:
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    if not body_path.exists():
+        return {}
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    return headers
+
+def _tee_to_cache(url: str, r: requests.Response) -> Iterator[bytes]:
+    """Yields the body chunks while saving them; the entry is only replaced once the whole body has arrived."""
+    chunks = r.iter_content(chunk_size=1 << 16)
+    meta = {"etag": r.headers.get("ETag"), "last_modified": r.headers.get("Last-Modified")}
+    if not (meta["etag"] or meta["last_modified"]):
+        yield from chunks
+        return
+    body_path, meta_path = _cache_paths(url)
+    SITEMAP_CACHE_DIR.mkdir(exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=SITEMAP_CACHE_DIR, suffix=".part", delete=False) as part:
+        try:
+            for chunk in chunks:
+                part.write(chunk)
+                yield chunk
+        except BaseException:
+            # Includes GeneratorExit when the parse stops early (--limit)
+            part.close()
+            os.unlink(part.name)
+            raise
+    # Body first: a crash before the validators are written only costs a re-download
+    os.replace(part.name, body_path)
+    meta_path.write_text(json.dumps(meta), encoding="utf-8")
+
+@contextmanager
+def open_sitemap(url: str):
+    """Yields the sitemap body as a binary stream, gunzipped on the fly when needed."""
+    with ExitStack() as stack:
+        r = stack.enter_context(get_session().get(url, stream=True, timeout=60, headers=cached_validators(url)))
+        if r.status_code == 304:
+            f = stack.enter_context(open(_cache_paths(url)[0], "rb"))
+            chunks = iter(partial(f.read, 1 << 16), b"")
+        else:
+            r.raise_for_status()
+            # iter_content undoes transport gzip/deflate as the body arrives
+            chunks = stack.enter_context(closing(_tee_to_cache(url, r)))
+        stream = io.BufferedReader(_ChunkReader(chunks))
+        # A .gz file (possibly served already decompressed): trust the magic bytes over the URL
+        while stream.peek(2)[:2] == GZIP_MAGIC:
+            stream = io.BufferedReader(gzip.GzipFile(fileobj=stream, mode="rb"))
+        yield stream
+
+def _iter_locs(url: str) -> Iterator[tuple[str, str]]:
+    """Yields ("url" | "sitemap", loc) pairs while the sitemap downloads, keeping one entry in memory."""
+    with open_sitemap(url) as stream:
+        # libxml2 only hands back <loc> elements; everything else stays in C.
+        # Sitemaps are untrusted remote XML: no entity expansion, no external fetches.
+        parser = etree.iterparse(
+            stream, events=("end",), tag=LOC_TAG,
+            resolve_entities=False, no_network=True, huge_tree=False,
+        )
+        for _, loc in parser:
+            entry = loc.getparent()
+            kind = LOC_PARENT_TAGS.get(entry.tag)
+            if kind and loc.text:
+                yield kind, loc.text.strip()
+            # Drop the entries before this one, so the tree never holds more than two
+            parent = entry.getparent()
+            while entry.getprevious() is not None:
+                del parent[0]
+
+def collect_urls_from_sitemap(url: str) -> Iterator[str]:
+    """Yields all <loc> URLs from a sitemap or sitemap index (recursively, 1 level)."""
+    found_urls = False
+    sitemaps = []
+    for kind, loc in _iter_locs(url):
+        if kind == "url":
+            found_urls = True
+            yield loc
+        else:
+            sitemaps.append(loc)
 
     # sitemapindex (one level deep)
-    if not urls:
-        for sm_loc in root.findall(".//sm:sitemap/sm:loc", NS):
-            if sm_loc.text:
-                try:
-                    urls.extend(collect_urls_from_urlset(sm_loc.text.strip()))
-                except Exception:
-                    pass
-    return urls
-
-def collect_urls_from_urlset(url: str) -> list[str]:
-    root = parse_xml_bytes(fetch_bytes(url))
-    out = []
-    for loc in root.findall(".//sm:url/sm:loc", NS):
-        if loc.text:
-            out.append(loc.text.strip())
-    return out
-
-def dedupe_preserve_order(items):
+    if not found_urls:
+        yield from collect_urls_from_urlsets(sitemaps)
+
+def collect_urls_from_urlset(url: str) -> Iterator[str]:
+    for kind, loc in _iter_locs(url):
+        if kind == "url":
+            yield loc
+
+def _urlset_locs(url: str) -> list[str]:
+    """All URLs of one child sitemap; a failed download keeps whatever was parsed before it."""
+    locs = []
+    try:
+        # extend() appends as the generator yields, so a mid-file error keeps the earlier URLs
+        locs.extend(collect_urls_from_urlset(url))
+    except Exception:
+        pass
+    return locs
+
+def collect_urls_from_urlsets(urls: list[str]) -> Iterator[str]:
+    """Yields the URLs of several child sitemaps in order, downloading up to SITEMAP_WORKERS at once."""
+    pending_urls = iter(urls)
+    with ThreadPoolExecutor(max_workers=SITEMAP_WORKERS) as executor:
+        # A bounded window instead of executor.map, so a consumer that stops early
+        # (--limit) leaves the rest of the index unfetched
+        pending = deque(executor.submit(_urlset_locs, u) for u in islice(pending_urls, SITEMAP_WORKERS))
+        while pending:
+            locs = pending.popleft().result()
+            for u in islice(pending_urls, 1):
+                pending.append(executor.submit(_urlset_locs, u))
+            yield from locs
+
+def dedupe_preserve_order(items: Iterable[str]) -> Iterator[str]:
+    """Yields each item the first time it is seen, so a consumer can stop early."""
     seen = set()
-    out = []
+    seen_add = seen.add
     for x in items:
         if x not in seen:
-            seen.add(x)
-            out.append(x)
-    return out
-
-def filter_by_keywords(urls: list[str], keywords: list[str]) -> list[str]:
-    """Keep URLs whose *path* contains any of the keywords (case-insensitive)."""
-    kws = [k.lower() for k in keywords]
-    out = []
-    for u in urls:
-        try:
-            path = urllib.parse.urlsplit(u).path.lower()
-        except Exception:
-            path = ""
-        if any(k in path for k in kws):
-            out.append(u)
-    return out
+            seen_add(x)
+            yield x
+
+@lru_cache(maxsize=32)
+def keyword_regex(keywords: tuple[str, ...]) -> re.Pattern:
+    """One alternation over the (lowercased) keywords, so each path is scanned once."""
+    return re.compile("|".join(map(re.escape, keywords)) if keywords else r"(?!)")
+
+# Path of a plain absolute http(s) URL: after the host, up to any query/fragment.
+# Hosts with brackets (IPv6, or malformed) are left to urlsplit.
+HTTP_PATH_RE = re.compile(r"(?i:https?)://[^/?#\[\]]*(?![^/?#])([^?#]*)")
+
+def url_path(u: str) -> str:
+    """Lowercased URL path, as urlsplit would give it ("" for URLs urlsplit rejects)."""
+    m = HTTP_PATH_RE.match(u)
+    # urlsplit strips control characters and vets non-ASCII hosts, so leave those URLs to it
+    if m and u.isascii() and u.isprintable():
+        return m.group(1).lower()
+    try:
+        return urllib.parse.urlsplit(u).path.lower()
+    except Exception:
+        return ""
+
+def filter_by_keywords(urls: Iterable[str], keywords: list[str]) -> Iterator[str]:
+    """Yields URLs whose *path* contains any of the keywords (case-insensitive)."""
+    search = keyword_regex(tuple(sorted({k.lower() for k in keywords}))).search
+    return (u for u in urls if search(url_path(u)))
 
 def main():
     p = argparse.ArgumentParser(description="Filter sitemap URLs to those with data-related path keywords.")
@@ -94,16 +248,14 @@ def main():
     args = p.parse_args()
 
     try:
-        urls = collect_urls_from_sitemap(args.sitemap_url)
-        urls = dedupe_preserve_order(urls)
-
         keywords = DEFAULT_KEYWORDS
         if args.keywords:
             keywords = [s.strip() for s in args.keywords.split(",") if s.strip()]
 
-        filtered = filter_by_keywords(urls, keywords)
-        if args.limit and args.limit > 0:
-            filtered = filtered[:args.limit]
+        # Every stage is lazy, so with --limit parsing (and child sitemap fetching)
+        # stops as soon as enough matches have been found
+        urls = dedupe_preserve_order(collect_urls_from_sitemap(args.sitemap_url))
+        filtered = list(islice(filter_by_keywords(urls, keywords), args.limit if args.limit > 0 else None))
 
         text = "\n".join(filtered) + ("\n" if filtered else "")
         if args.output:
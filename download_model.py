@@ -1,23 +1,66 @@
 #!/usr/bin/env python3
 import requests
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
-def download_file(url, filename):
-    """Download a file with progress bar"""
-    response = requests.get(url, stream=True)
-    total_size = int(response.headers.get('content-length', 0))
+# Byte ranges fetched at once; several connections get past a single TCP window's limit
+DOWNLOAD_PARTS = 4
+CHUNK_SIZE = 1 << 20
+
+def download_file(url, filename, parts=DOWNLOAD_PARTS):
+    """Download a file with progress bar, in parallel byte ranges when the server supports them"""
+    with requests.Session() as session:
+        head = session.head(url, allow_redirects=True)
+        head.raise_for_status()
+        total_size = int(head.headers.get('content-length', 0))
+        
+        with tqdm(
+            desc=filename,
+            total=total_size,
+            unit='iB',
+            unit_scale=True,
+            unit_divisor=1024,
+        ) as pbar:
+            if parts > 1 and total_size and 'bytes' in head.headers.get('Accept-Ranges', '').lower():
+                # head.url is past any redirect (Hugging Face sends downloads to a CDN)
+                download_ranges(session, head.url, filename, total_size, parts, pbar)
+            else:
+                download_stream(session, url, filename, pbar)
+
+def download_stream(session, url, filename, pbar):
+    """Download the whole file over one connection"""
+    response = session.get(url, stream=True)
+    response.raise_for_status()
+    with open(filename, 'wb') as file:
+        for data in response.iter_content(chunk_size=CHUNK_SIZE):
+            pbar.update(file.write(data))
+
+def download_ranges(session, url, filename, total_size, parts, pbar):
+    """Download equal byte ranges concurrently, each written at its own offset"""
+    with open(filename, 'wb') as file:
+        file.truncate(total_size)
+    pbar_lock = threading.Lock()
+    
+    def download_range(start, end):
+        response = session.get(url, headers={'Range': f'bytes={start}-{end}'}, stream=True)
+        response.raise_for_status()
+        # Only a 206 for exactly this range may be written at its offset; a 200 is the whole file
+        content_range = response.headers.get('Content-Range', '')
+        if response.status_code != 206 or not content_range.startswith(f"bytes {start}-{end}/"):
+            raise IOError(f"Server did not return bytes {start}-{end} (status {response.status_code}, Content-Range {content_range!r})")
+        with open(filename, 'r+b') as file:
+            file.seek(start)
+            for data in response.iter_content(chunk_size=CHUNK_SIZE):
+                size = file.write(data)
+                with pbar_lock:
+                    pbar.update(size)
     
-    with open(filename, 'wb') as file, tqdm(
-        desc=filename,
-        total=total_size,
-        unit='iB',
-        unit_scale=True,
-        unit_divisor=1024,
-    ) as pbar:
-        for data in response.iter_content(chunk_size=1024):
-            size = file.write(data)
-            pbar.update(size)
+    bounds = [(total_size * i // parts, total_size * (i + 1) // parts - 1) for i in range(parts)]
+    with ThreadPoolExecutor(max_workers=parts) as executor:
+        # list() re-raises the first failed range
+        list(executor.map(lambda b: download_range(*b), bounds))
 
 def main():
     print("🚀 GPT-OSS-7B Model Downloader")
@@ -3,8 +3,12 @@
 Australia Open Data Discovery Hub - Startup Script
 """
 
+import os
+
 from app import app
 
+DEBUG = os.getenv('FLASK_DEBUG', '').lower() in ('1', 'true')
+
 if __name__ == '__main__':
     print("🚀 Starting Australia Open Data Discovery Hub...")
     print("📊 Loaded 20 curated Australian datasets")
@@ -13,4 +17,5 @@ if __name__ == '__main__':
     print("💡 Press Ctrl+C to stop the server")
     print("-" * 60)
     
-    app.run(debug=True, host='0.0.0.0', port=3000)
+    # No reloader: it would import the app, and load the model, a second time
+    app.run(debug=DEBUG, use_reloader=False, host='0.0.0.0', port=3000)
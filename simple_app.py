@@ -1,13 +1,22 @@
 #!/usr/bin/env python3
 from flask import Flask, request, jsonify
-from llama_cpp import Llama
+from llama_cpp import Llama, GGML_TYPE_Q8_0, llama_supports_gpu_offload
 import os
+import threading
 
 app = Flask(__name__)
 
 # Simple model loading
 MODEL_PATH = 'models/phi-2-2.7b.gguf'
+# Offload every layer when llama.cpp was built with CUDA/Metal; N_GPU_LAYERS overrides
+N_GPU_LAYERS = int(os.getenv('N_GPU_LAYERS', -1 if llama_supports_gpu_offload() else 0))
+# Lock the weights in RAM only when there is room for them (LLM_MLOCK=1); off by default
+USE_MLOCK = os.getenv('LLM_MLOCK', '').lower() in ('1', 'true')
+# Generation is memory-bound and tops out around the physical core count; prompt batches use every thread
+CPU_COUNT = os.cpu_count() or 2
 model = None
+# A llama.cpp context can only run one generation at a time
+_INFER_LOCK = threading.Lock()
 
 def load_model():
     global model
@@ -16,12 +25,23 @@ def load_model():
         model = Llama(
             model_path=MODEL_PATH,
             n_ctx=1024,
-            n_threads=8,
-            n_gpu_layers=0
+            n_threads=max(1, CPU_COUNT // 2),
+            n_threads_batch=CPU_COUNT,
+            n_gpu_layers=N_GPU_LAYERS,
+            n_batch=512,
+            use_mmap=True,
+            use_mlock=USE_MLOCK,  # Keep weights resident (llama.cpp only warns if RLIMIT_MEMLOCK is too low)
+            type_k=GGML_TYPE_Q8_0,  # 8-bit KV cache: half the bytes of f16 per token
+            type_v=GGML_TYPE_Q8_0,
+            flash_attn=True  # Required by llama.cpp for a quantized V cache
         )
         print("✅ Model loaded!")
     return model
 
+# Load at startup so the first request doesn't pay for it
+if os.path.exists(MODEL_PATH):
+    load_model()
+
 @app.route('/')
 def home():
     return "AI Chat App is running! Use /chat to test."
@@ -43,11 +63,12 @@ def chat():
         print("🤖 Generating response...")
         
         # Get response
-        response = local_model(
-            prompt,
-            max_tokens=100,
-            temperature=0.5
-        )
+        with _INFER_LOCK:
+            response = local_model(
+                prompt,
+                max_tokens=100,
+                temperature=0.5
+            )
         
         print(f"📝 Response: {response}")
         
@@ -74,4 +95,5 @@ if __name__ == '__main__':
     print(f"📁 Model path: {MODEL_PATH}")
     print(f"📁 Model exists: {os.path.exists(MODEL_PATH)}")
     
-    app.run(debug=True, port=5001)
+    # No reloader: it would import this module, and load the model, a second time
+    app.run(debug=os.getenv('FLASK_DEBUG', '').lower() in ('1', 'true'), port=5001, use_reloader=False)
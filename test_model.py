@@ -1,6 +1,13 @@
 #!/usr/bin/env python3
 import os
-from llama_cpp import Llama
+from llama_cpp import Llama, GGML_TYPE_Q8_0, llama_supports_gpu_offload
+
+# Offload every layer when llama.cpp was built with CUDA/Metal; N_GPU_LAYERS overrides
+N_GPU_LAYERS = int(os.getenv('N_GPU_LAYERS', -1 if llama_supports_gpu_offload() else 0))
+# Lock the weights in RAM only when there is room for them (LLM_MLOCK=1); off by default
+USE_MLOCK = os.getenv('LLM_MLOCK', '').lower() in ('1', 'true')
+# Generation is memory-bound and tops out around the physical core count; prompt batches use every thread
+CPU_COUNT = os.cpu_count() or 2
 
 def test_model():
     model_path = "models/phi-2-2.7b.gguf"
@@ -16,11 +23,15 @@ def test_model():
             model = Llama(
                 model_path=model_path,
                 n_ctx=1024,
-                n_threads=8,
-                n_gpu_layers=0,
+                n_threads=max(1, CPU_COUNT // 2),
+                n_threads_batch=CPU_COUNT,
+                n_gpu_layers=N_GPU_LAYERS,
                 n_batch=512,
                 use_mmap=True,
-                use_mlock=False
+                use_mlock=USE_MLOCK,  # Keep weights resident (llama.cpp only warns if RLIMIT_MEMLOCK is too low)
+                type_k=GGML_TYPE_Q8_0,  # 8-bit KV cache: half the bytes of f16 per token
+                type_v=GGML_TYPE_Q8_0,
+                flash_attn=True  # Required by llama.cpp for a quantized V cache
             )
             print("✅ Model loaded successfully!")
             